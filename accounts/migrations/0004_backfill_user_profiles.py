@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+
+    missing = User.objects.filter(profile__isnull=True).values_list('id', 'rating')
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, peak_rating=rating) for user_id, rating in missing],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_userprofile_matches'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
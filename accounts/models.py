@@ -1,8 +1,6 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 
 # Create your models here.
 
@@ -36,27 +34,3 @@ class UserProfile(models.Model):
     @property
     def current_rating(self)->int:
         return self.user.rating
-
-
-
-# accounts/models.py
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from django.utils import timezone
-
-@receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance: User, created, **kwargs):
-    profile, created_profile = UserProfile.objects.get_or_create(
-        user=instance,
-        defaults={
-            "matches": 0,
-            "peak_rating": instance.rating,   # sync initial peak to starting rating
-            "last_rating_change": 0,
-            "last_active": timezone.now(),
-        },
-    )
-
-    # If not newly created and rating went up, bump peak
-    if not created_profile and instance.rating > profile.peak_rating:
-        profile.peak_rating = instance.rating
-        profile.save(update_fields=["peak_rating"])
\ No newline at end of file
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import User, UserProfile
+from .signals import profile_signal_suppressed
+
+
+BATCH_SIZE = 500
+
+
+def apply_rating_changes(changes, batch_size=BATCH_SIZE):
+    """
+    Apply rating deltas ({user_id: delta}) set-wise: one UPDATE on users and one
+    on profiles per batch (rating, peak_rating, last_rating_change, matches),
+    with the per-user post_save profile hook suppressed.
+    """
+    user_ids = list(changes)
+    now = timezone.now()
+
+    with profile_signal_suppressed(), transaction.atomic():
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            delta = Case(
+                *[When(pk=user_id, then=Value(changes[user_id])) for user_id in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            User.objects.filter(pk__in=batch).update(rating=F("rating") + delta)
+
+            profile_delta = Case(
+                *[When(user_id=user_id, then=Value(changes[user_id])) for user_id in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            new_rating = Subquery(User.objects.filter(pk=OuterRef("user_id")).values("rating")[:1])
+            UserProfile.objects.filter(user_id__in=batch).update(
+                matches=F("matches") + 1,
+                last_rating_change=profile_delta,
+                peak_rating=Greatest(F("peak_rating"), new_rating),
+                last_active=now,
+            )
@@ -0,0 +1,43 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import User, UserProfile
+
+
+_state = threading.local()
+
+
+@contextmanager
+def profile_signal_suppressed():
+    """Skip the User post_save profile hook for saves made inside the block (this thread only)."""
+    _state.depth = getattr(_state, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+def _suppressed():
+    return getattr(_state, "depth", 0) > 0
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance: User, created, raw=False, update_fields=None, **kwargs):
+    """
+    The profile is created exactly once, at signup. Later saves only touch it when
+    rating is (possibly) being written, with a single conditional UPDATE for the peak.
+    """
+    if raw or _suppressed():
+        return
+
+    if created:
+        UserProfile.objects.create(user=instance, peak_rating=instance.rating)
+        return
+
+    if update_fields is not None and "rating" not in update_fields:
+        return   # e.g. last_login on every login
+
+    UserProfile.objects.filter(user=instance, peak_rating__lt=instance.rating).update(peak_rating=instance.rating)
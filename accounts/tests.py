@@ -1,3 +1,43 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models import User, UserProfile
+from .ratings import apply_rating_changes
+
+
+class ProfileTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="user", rating=1500)
+
+    def peak(self):
+        return UserProfile.objects.get(user=self.user).peak_rating
+
+    def test_profile_created_once_at_signup(self):
+        self.assertEqual(self.peak(), 1500)
+        self.user.first_name = "Ann"
+        self.user.save()
+        self.assertEqual(UserProfile.objects.filter(user=self.user).count(), 1)
+
+    def test_saves_without_rating_leave_the_profile_alone(self):
+        with self.assertNumQueries(1):   # the UPDATE of the user only
+            self.user.save(update_fields=["last_login"])
+
+    def test_peak_only_rises(self):
+        self.user.rating = 1600
+        self.user.save(update_fields=["rating"])
+        self.assertEqual(self.peak(), 1600)
+
+        self.user.rating = 1400
+        self.user.save()
+        self.assertEqual(self.peak(), 1600)
+
+    def test_bulk_rating_changes(self):
+        other = User.objects.create(username="other", rating=1500)
+        with self.assertNumQueries(4):   # savepoint, users, profiles, release
+            apply_rating_changes({self.user.id: 40, other.id: -40})
+
+        self.assertEqual(User.objects.get(pk=other.pk).rating, 1460)
+        profiles = {p.user_id: p for p in UserProfile.objects.all()}
+        self.assertEqual((profiles[self.user.id].peak_rating, profiles[self.user.id].last_rating_change), (1540, 40))
+        self.assertEqual((profiles[other.id].peak_rating, profiles[other.id].last_rating_change), (1500, -40))
+        self.assertEqual(profiles[other.id].matches, 1)
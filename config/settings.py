@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'contest.metrics.MetricsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +93,14 @@ if USE_SQLITE:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / "db.sqlite3",
+            # IMMEDIATE transactions as in settings_production: select_for_update is a
+            # no-op on SQLite, so concurrent submits must queue for the write lock.
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+            # file-backed test database: the threaded tests need several connections,
+            # which the in-memory one can't serve concurrently. TEST_DB_NAME gives
+            # parallel checkouts/runs a file each; TEST_DB_NAME= (empty) runs in
+            # memory and skips the threaded tests.
+            'TEST': {'NAME': os.getenv("TEST_DB_NAME", str(BASE_DIR / "test_db.sqlite3")) or None},
         }
     }
 else:
@@ -176,4 +185,77 @@ REST_FRAMEWORK = {
 AUTH_USER_MODEL = 'accounts.User'
 
 
-PENALTY_MULTIPLIER = 10
\ No newline at end of file
+# Caches
+# "default" is process-local. "quiz" holds the precomputed question payloads
+# and answer keys of each quiz, the embargo set and facet counts. Their
+# invalidations (contest.signals) only reach other worker processes through a
+# shared backend: set QUIZ_CACHE_BACKEND=file (one host),
+# =db (`manage.py createcachetable`) or =redis (REDIS_URL). config.settings_production
+# refuses locmem; here, with one development process, locmem is fine and its
+# entries expire after QUIZ_CACHE_LOCAL_TIMEOUT seconds anyway, which bounds
+# how stale a second process could get.
+
+QUIZ_CACHE_BACKEND = os.getenv("QUIZ_CACHE_BACKEND", "locmem")
+QUIZ_CACHE_LOCAL_TIMEOUT = int(os.getenv("QUIZ_CACHE_LOCAL_TIMEOUT", "60"))
+
+QUIZ_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "quiz-payloads",
+        "TIMEOUT": QUIZ_CACHE_LOCAL_TIMEOUT,
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "quiz",
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "quiz_cache",
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",   # pip install redis
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "quiz": {
+        "TIMEOUT": None,   # shared backends: entries are invalidated explicitly by contest.signals
+        **QUIZ_CACHE_BACKENDS[QUIZ_CACHE_BACKEND],
+    },
+}
+
+
+PENALTY_MULTIPLIER = 10
+
+# Stricter option grading: an SCQ scores only for exactly the correct option and an
+# MCQ with any wrong pick scores 0. Changing it regrades on the next rescore_quiz /
+# recompute_standings, so switch it only between contests.
+STRICT_GRADING = os.getenv("STRICT_GRADING", "false").lower() == "true"
+
+# Write-behind submissions: the submit endpoint only queues answer batches and
+# `manage.py drain_submissions` workers grade them (queue stats at /contest/submit-queue/)
+SUBMISSION_WRITE_BEHIND = os.getenv("SUBMISSION_WRITE_BEHIND", "false").lower() == "true"
+
+# Standings rank method: "competition" (1,2,2,4), "dense" (1,2,2,3) or "ordinal" (1,2,3,4)
+STANDINGS_RANK_METHOD = "competition"
+
+# During a live quiz, re-rank at most once every N seconds as submissions arrive (0 = only on finalize/recompute)
+STANDINGS_LIVE_RERANK_SECONDS = 5
+
+# Live standings stream (SSE, ASGI only): push interval and number of top rows pushed
+LIVE_STANDINGS_TICK_SECONDS = 1.0
+LIVE_STANDINGS_SIZE = 200
+
+# Request metrics (contest.metrics), served in the Prometheus text format at /metrics/.
+# DB query counting/timing runs on METRICS_SAMPLE_RATE of the requests; latency,
+# status and response size are recorded for all of them.
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "0.1"))
+# Bearer token for the scraper; without one only staff users can read /metrics/
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Optional file dump of the same text, rewritten at most every METRICS_DUMP_SECONDS ("{pid}" = worker pid)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_DUMP_SECONDS = 60
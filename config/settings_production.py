@@ -0,0 +1,107 @@
+"""
+Production settings: DJANGO_SETTINGS_MODULE=config.settings_production.
+
+Everything from config.settings, minus the development-only parts that cost
+every worker process start-up time. debug_toolbar's SQL panel alone imports
+django.contrib.gis and libgdal, over 100 ms per process.
+Measure with `python -m config.startup_bench --settings config.settings_production`.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, QUIZ_CACHE_BACKENDS, USE_SQLITE
+
+
+DEBUG = False
+
+# never the development key committed in config.settings
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "")
+if not SECRET_KEY or SECRET_KEY.startswith("django-insecure-"):
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set to a fresh secret key in production")
+
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if host]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if not middleware.startswith("debug_toolbar.")]
+
+
+# HTTPS
+# Served over TLS only: plain HTTP is redirected, cookies are marked Secure and
+# browsers are told (HSTS) to stay on HTTPS. HTTPS=false turns all of it off for
+# a plain-HTTP run on a private network. When a proxy terminates TLS, set
+# BEHIND_TLS_PROXY=true so its X-Forwarded-Proto is trusted - only if the proxy
+# overwrites that header, or clients could spoof it. HSTS doesn't cover
+# subdomains by default: they may not all serve HTTPS (SECURE_HSTS_INCLUDE_SUBDOMAINS).
+
+HTTPS = os.getenv("HTTPS", "true").lower() == "true"
+
+SECURE_SSL_REDIRECT = HTTPS
+SESSION_COOKIE_SECURE = HTTPS
+CSRF_COOKIE_SECURE = HTTPS
+SECURE_HSTS_SECONDS = int(os.getenv("SECURE_HSTS_SECONDS", "31536000" if HTTPS else "0"))
+SECURE_HSTS_INCLUDE_SUBDOMAINS = os.getenv("SECURE_HSTS_INCLUDE_SUBDOMAINS", "false").lower() == "true"
+
+if os.getenv("BEHIND_TLS_PROXY", "false").lower() == "true":
+    SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+
+
+# Database connections
+# Connections are kept open between requests (DB_CONN_MAX_AGE seconds) and
+# pinged before reuse, so a worker doesn't pay a new connection on every request
+# nor fail its first one after the server dropped an idle connection.
+
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "600"))
+
+DATABASES["default"]["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+if USE_SQLITE:
+    # Single-node deployments. WAL lets readers run while one connection writes;
+    # synchronous=NORMAL is durable under WAL except for the last transactions on
+    # power loss; busy_timeout makes a writer wait for the lock instead of failing.
+    # IMMEDIATE transactions take the write lock up front: a deferred one that
+    # reads first and then tries to write can't wait for it and fails at once
+    # with "database is locked" when another writer got in between.
+    DATABASES["default"]["OPTIONS"] = {
+        "transaction_mode": "IMMEDIATE",
+        "init_command": (
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))};"
+            f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))};"
+            "PRAGMA cache_size=-20000;"    # 20 MB page cache per connection
+            "PRAGMA temp_store=MEMORY;"
+        ),
+    }
+elif os.getenv("DB_POOL", "false").lower() == "true":
+    # psycopg 3 connection pool shared by the threads of a worker process
+    # (pip install "psycopg[pool]"). Django requires CONN_MAX_AGE=0 with a pool:
+    # connections go back to the pool at the end of each request.
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+
+
+# Caches
+# Every worker process must see the same cached answer keys, embargo set and
+# live re-rank throttle, or invalidations made by one
+# worker never reach the others. locmem is per process, so it is refused; the
+# default is the file backend, which is shared by the workers of one host.
+# Use QUIZ_CACHE_BACKEND=db or =redis across hosts.
+
+QUIZ_CACHE_BACKEND = os.getenv("QUIZ_CACHE_BACKEND", "file")
+if QUIZ_CACHE_BACKEND not in QUIZ_CACHE_BACKENDS or QUIZ_CACHE_BACKEND == "locmem":
+    raise ImproperlyConfigured(
+        f"QUIZ_CACHE_BACKEND={QUIZ_CACHE_BACKEND!r}: production needs a cache shared by all "
+        "worker processes (file, db or redis)"
+    )
+
+CACHES = {
+    "default": {**QUIZ_CACHE_BACKENDS[QUIZ_CACHE_BACKEND], "KEY_PREFIX": "default"},
+    "quiz": {**QUIZ_CACHE_BACKENDS[QUIZ_CACHE_BACKEND], "TIMEOUT": None},
+}
@@ -0,0 +1,108 @@
+"""
+Startup benchmark: how long a fresh worker process takes to serve its first request.
+
+    python -m config.startup_bench                                  # development settings
+    python -m config.startup_bench --settings config.settings_production
+    python -m config.startup_bench --importtime importtime.txt      # also write a -X importtime report
+
+Each run starts a new interpreter that imports config.wsgi (settings, app
+registry, models, signals, admin) and sends one request straight to the WSGI
+callable, so the numbers are what an autoscaled gunicorn/uwsgi worker pays
+before it can take traffic. Reports the median of --runs runs as JSON.
+The request is made as HTTPS, so production settings serve it instead of
+redirecting; they also need DJANGO_SECRET_KEY in the environment.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import io, json, os, sys, time
+t0 = time.perf_counter()
+os.environ["DJANGO_SETTINGS_MODULE"] = sys.argv[1]
+from config.wsgi import application
+t1 = time.perf_counter()
+status = []
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[2], "QUERY_STRING": "",
+    "SERVER_NAME": sys.argv[3], "SERVER_PORT": "443", "HTTP_HOST": sys.argv[3],
+    "HTTP_ACCEPT": "application/json", "wsgi.url_scheme": "https", "wsgi.input": io.BytesIO(),
+    "wsgi.errors": sys.stderr, "wsgi.multithread": False, "wsgi.multiprocess": True, "wsgi.run_once": False,
+    "wsgi.version": (1, 0),
+}
+body = b"".join(application(environ, lambda s, h, e=None: status.append(s)))
+t2 = time.perf_counter()
+print(json.dumps({"wsgi_import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                  "status": status[0], "modules": len(sys.modules)}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_once(settings, path, host, importtime=False):
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD, settings, path, host]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BASE_DIR, capture_output=True, text=True)
+    total = (time.perf_counter() - started) * 1000
+    if proc.returncode:
+        raise SystemExit(proc.stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = total
+    return result, proc.stderr
+
+
+def importtime_report(stderr, top=40):
+    """Sorted -X importtime report: top-level total, then the slowest modules by cumulative time."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((int(cumulative_us), int(self_us), len(indent) // 2, module))
+    top_level = sum(cumulative for cumulative, _, depth, _ in rows if depth == 0)
+    lines = [f"total top-level import time: {top_level / 1000:.1f} ms over {len(rows)} modules",
+             "cumulative [ms] |   self [ms] | module"]
+    for cumulative, self_us, _, module in sorted(rows, reverse=True)[:top]:
+        lines.append(f"{cumulative / 1000:15.1f} | {self_us / 1000:11.1f} | {module}")
+    return "\n".join(lines) + "\n", top_level / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", default="config.settings")
+    parser.add_argument("--path", default="/contest/Quizzes/", help="URL of the first request.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", metavar="FILE", help="Write a sorted -X importtime report to FILE.")
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.settings, args.path, args.host)[0] for _ in range(args.runs)]
+    report = {
+        "settings": args.settings,
+        "path": args.path,
+        "status": runs[0]["status"],
+        "modules": runs[0]["modules"],
+        **{key: round(statistics.median(run[key] for run in runs), 1)
+           for key in ("process_ms", "wsgi_import_ms", "first_request_ms")},
+    }
+
+    if args.importtime:
+        _, stderr = run_once(args.settings, args.path, args.host, importtime=True)
+        text, report["importtime_ms"] = importtime_report(stderr)
+        Path(args.importtime).write_text(text)
+        report["importtime_ms"] = round(report["importtime_ms"], 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from django.contrib import admin
 from. import models
+from .search import filter_matching
+from .standings import recompute_standings
 from django.utils.html import format_html, urlencode
 
 # Register your models here.
@@ -27,9 +29,14 @@ class QuestionImageInline(admin.TabularInline):
 class QuestionAdmin(admin.ModelAdmin):
 
     list_display = ['title','subject','type','chapter','correct_answer']
-    search_fields = ['statement']
+    search_fields = ['title', 'statement']   # shows the search box; matching is full-text, see below
     list_filter = ['type','level']
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return filter_matching(queryset, search_term), False
+
     inlines = [QuestionImageInline,QuestionOptionInline]
 
 
@@ -40,6 +47,13 @@ class QuizAdmin(admin.ModelAdmin):
 
     list_filter = ['subject','is_rated']
     search_fields = ['title']
+    actions = ['recompute_quiz_standings']
+
+    @admin.action(description="Recompute standings (regrade all submissions)")
+    def recompute_quiz_standings(self, request, queryset):
+        for quiz in queryset:
+            ranked = recompute_standings(quiz.id)
+            self.message_user(request, f"{quiz.title}: regraded and ranked {ranked} participant(s).")
 
 
 
@@ -63,8 +77,21 @@ class UserQuizResultAdmin(admin.ModelAdmin):
 
 
 
+    @admin.action(description="Finalize the selected results' quizzes (rank + rating update)")
     def finalize_selected_quiz(self, request, queryset):
-        pass
+        from .rating import finalize_quiz   # pulls in numpy; keep it out of every worker's startup
+        quiz_ids = queryset.values_list('quiz_id', flat=True).distinct()
+        for quiz_id in quiz_ids:
+            finalized = finalize_quiz(quiz_id)
+            self.message_user(request, f"Quiz {quiz_id}: ranked and finalized {finalized} result(s).")
 
     # def quizzes_title(self, question):
-    #     return question.quizzes.title
\ No newline at end of file
+    #     return question.quizzes.title
+
+
+@admin.register(models.PendingSubmission)
+class PendingSubmissionAdmin(admin.ModelAdmin):
+
+    list_display = ['id','user','quiz','enqueued_at','attempts','failed_at']
+    list_filter = ['quiz','failed_at']
+
@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .leaderboard import invalidate_leaderboard, track_result_delta
+from .models import Submission, UserQuizResult
+
+
+def contribution(points):
+    """(score, correct_answers, penalties) that one graded submission adds to its result."""
+    points = float(points)
+    if points > 0:
+        return points, 1, 0
+    return points - settings.PENALTY_MULTIPLIER, 0, 1
+
+
+def submission_delta(new_points, old_points=None):
+    """
+    Change in (score, correct_answers, penalties) when a submission is graded
+    for the first time (old_points=None) or regraded from old_points.
+    """
+    score, correct, penalties = contribution(new_points)
+    if old_points is not None:
+        old_score, old_correct, old_penalties = contribution(old_points)
+        score, correct, penalties = score - old_score, correct - old_correct, penalties - old_penalties
+    return score, correct, penalties
+
+
+def _upsert_result_delta(user_id, quiz_id, score, correct_answers, penalties):
+    """
+    One INSERT ... ON CONFLICT DO UPDATE: the row is created with the delta or
+    the delta is added to it, atomically, by a single statement. The conflict
+    target repeats the predicate of the partial unique index
+    uniq_live_result_per_user_quiz so virtual results never match.
+    """
+    qn = connection.ops.quote_name
+    table = qn(UserQuizResult._meta.db_table)
+    score_col, correct_col, penalties_col = qn("score"), qn("correct_answers"), qn("penalties")
+    sql = f"""
+        INSERT INTO {table} ({qn("user_id")}, {qn("quiz_id")}, {score_col}, {correct_col}, {penalties_col},
+                             {qn("is_virtual")}, {qn("status")}, {qn("created_at")})
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT ({qn("user_id")}, {qn("quiz_id")}) WHERE NOT {qn("is_virtual")}
+        DO UPDATE SET {score_col} = {table}.{score_col} + excluded.{score_col},
+                      {correct_col} = {table}.{correct_col} + excluded.{correct_col},
+                      {penalties_col} = {table}.{penalties_col} + excluded.{penalties_col}
+    """
+    params = [
+        user_id, quiz_id, score, correct_answers, penalties,
+        False, UserQuizResult.Status.PENDING, connection.ops.adapt_datetimefield_value(timezone.now()),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _update_or_create_result_delta(user_id, quiz_id, score, correct_answers, penalties):
+    """Fallback for backends without ON CONFLICT: F() update, create on the first answer."""
+    live = UserQuizResult.objects.filter(user_id=user_id, quiz_id=quiz_id, is_virtual=False)
+    changes = {
+        "score": F("score") + score,
+        "correct_answers": F("correct_answers") + correct_answers,
+        "penalties": F("penalties") + penalties,
+    }
+    if not live.update(**changes):
+        try:
+            with transaction.atomic():
+                UserQuizResult.objects.create(
+                    user_id=user_id, quiz_id=quiz_id,
+                    score=score, correct_answers=correct_answers, penalties=penalties,
+                )
+        except IntegrityError:
+            # another request created the row in between
+            live.update(**changes)
+
+
+def apply_result_delta(user_id, quiz_id, score=0, correct_answers=0, penalties=0):
+    """
+    Add a delta to the live UserQuizResult of (user, quiz), creating the row on
+    the first answer. The arithmetic happens in the database, so concurrent
+    submissions of the same user neither lose an update nor collide on the
+    unique live result: a single upsert on PostgreSQL and SQLite >= 3.24.
+    """
+    if not (score or correct_answers or penalties):
+        return
+
+    # a regrade taking a correct answer away: SQLite checks correct_answers >= 0
+    # on the proposed INSERT row even when it resolves to an update. The row
+    # exists by then (it was counted), so the plain F() update does it.
+    if connection.features.supports_update_conflicts_with_target and correct_answers >= 0:
+        _upsert_result_delta(user_id, quiz_id, score, correct_answers, penalties)
+    else:
+        _update_or_create_result_delta(user_id, quiz_id, score, correct_answers, penalties)
+
+    track_result_delta(user_id, quiz_id)
+
+
+def apply_submission(submission, old_points=None):
+    """Fold one (re)graded submission into its result."""
+    score, correct, penalties = submission_delta(submission.points_rewarded, old_points)
+    apply_result_delta(submission.user_id, submission.quiz_id, score, correct, penalties)
+
+
+def expected_results(quiz_id=None):
+    """
+    Full recompute of every (user, quiz) total from submissions, in one grouped query.
+    Returns {(user_id, quiz_id): (score, correct_answers, penalties)}.
+    """
+    submissions = Submission.objects.all()
+    if quiz_id is not None:
+        submissions = submissions.filter(quiz_id=quiz_id)
+
+    rows = (submissions
+            .values("user_id", "quiz_id")
+            .annotate(
+                points=Sum("points_rewarded"),
+                correct=Count("id", filter=Q(points_rewarded__gt=0)),
+                wrong=Count("id", filter=Q(points_rewarded__lte=0)),
+            ))
+    return {
+        (row["user_id"], row["quiz_id"]): (
+            float(row["points"] or 0) - row["wrong"] * settings.PENALTY_MULTIPLIER,
+            row["correct"],
+            row["wrong"],
+        )
+        for row in rows
+    }
+
+
+def reconcile_results(quiz_id=None, fix=False):
+    """
+    Compare live UserQuizResult totals against a full recompute.
+    Returns a list of (user_id, quiz_id, stored, expected) mismatches; stored is
+    None when the result row is missing. With fix=True the rows are rewritten.
+    """
+    expected = expected_results(quiz_id)
+
+    results = UserQuizResult.objects.filter(is_virtual=False)
+    if quiz_id is not None:
+        results = results.filter(quiz_id=quiz_id)
+
+    mismatches, to_update = [], []
+    for result in results.only("id", "user_id", "quiz_id", "score", "correct_answers", "penalties"):
+        key = (result.user_id, result.quiz_id)
+        want = expected.pop(key, (0.0, 0, 0))
+        have = (result.score, result.correct_answers, result.penalties)
+        if round(have[0], 2) != round(want[0], 2) or have[1:] != want[1:]:
+            mismatches.append((result.user_id, result.quiz_id, have, want))
+            result.score, result.correct_answers, result.penalties = want
+            to_update.append(result)
+
+    # submissions without any result row
+    missing = [
+        UserQuizResult(user_id=user_id, quiz_id=q_id, score=want[0], correct_answers=want[1], penalties=want[2])
+        for (user_id, q_id), want in expected.items()
+    ]
+    mismatches.extend((r.user_id, r.quiz_id, None, (r.score, r.correct_answers, r.penalties)) for r in missing)
+
+    if fix and (to_update or missing):
+        with transaction.atomic():
+            UserQuizResult.objects.bulk_update(to_update, ["score", "correct_answers", "penalties"], batch_size=1000)
+            UserQuizResult.objects.bulk_create(missing, batch_size=1000)
+            for q_id in {r.quiz_id for r in to_update} | {r.quiz_id for r in missing}:
+                transaction.on_commit(lambda q_id=q_id: invalidate_leaderboard(q_id))
+
+    return mismatches
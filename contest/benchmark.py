@@ -0,0 +1,378 @@
+"""
+Load-test harness behind `manage.py benchmark_contest`.
+
+A benchmark run builds a synthetic contest (build_contest), turns it into a
+timeline of requests (build_timeline) or loads a recorded one (read_trace),
+replays it with concurrent workers (replay) and summarizes latency, throughput
+and DB queries per endpoint (summarize).
+
+Trace files are JSON lines, one request per line:
+
+    {"t": 12.5, "user": 3, "method": "POST", "path": "/contest/Quizzes/{quiz}/submit/",
+     "body": {"answers": [...]}, "endpoint": "quiz-submit"}
+
+t is the offset in seconds from the start of the run, user the index of the
+synthetic participant sending it (null for anonymous), "{quiz}" in the path is
+replaced by the id of the synthetic quiz. body and endpoint are optional; the
+endpoint defaults to the URL name the path resolves to. Option and question
+ids in bodies refer to a contest built with the same contest options
+(--participants, --questions, --options, --types, --seed) on a fresh test
+database, which is what --write-trace records.
+"""
+import json
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import got_request_exception
+from django.db import connection
+from django.test import Client
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from .models import Chapter, Question, QuestionOption, Quiz, QuizQuestion
+
+
+QUERY_COUNT_HEADER = "X-Benchmark-Queries"
+
+
+class SyntheticContest:
+
+    def __init__(self, quiz, questions, users):
+        self.quiz = quiz
+        self.questions = questions    # [(question id, type, [option ids], [correct option ids], integer answer)]
+        self.users = users
+
+
+def build_contest(participants=1000, questions=50, options=4, types=None, seed=0):
+    """
+    One visible quiz with `questions` questions (types drawn from the
+    {type: weight} mix, default all single correct) and `participants` users.
+    Everything is bulk created.
+    """
+    rng = random.Random(seed)
+    types = types or {Question.TYPE_SINGLE: 1}
+    chapter = Chapter.objects.create(title="Benchmark", subject="Maths")
+    quiz = Quiz.objects.create(title="Benchmark", subject="MATH", created_at=timezone.now(), is_visible=True)
+
+    drawn = rng.choices(list(types), weights=list(types.values()), k=questions)
+    rows = Question.objects.bulk_create([
+        Question(title=f"Benchmark {i}", level="Medium", subject="MATH", statement="...", type=q_type,
+                 chapter=chapter, is_visible=True,
+                 correct_answer=str(rng.randint(0, 99)) if q_type == Question.TYPE_INTEGER else None)
+        for i, q_type in enumerate(drawn, start=1)
+    ])
+
+    option_rows = []
+    for question in rows:
+        if question.type == Question.TYPE_INTEGER:
+            continue
+        correct = set(rng.sample(range(options), 2 if question.type == Question.TYPE_MULTI else 1))
+        option_rows.extend(QuestionOption(question=question, text=f"Option {j}", is_correct=j in correct)
+                           for j in range(options))
+    QuestionOption.objects.bulk_create(option_rows)
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(quiz=quiz, question=question, order=i) for i, question in enumerate(rows, start=1)
+    ])
+
+    by_question = defaultdict(lambda: ([], []))
+    for option in option_rows:
+        by_question[option.question_id][0].append(option.id)
+        if option.is_correct:
+            by_question[option.question_id][1].append(option.id)
+    questions = [
+        (q.id, q.type, *by_question[q.id], int(q.correct_answer) if q.correct_answer is not None else None)
+        for q in rows
+    ]
+
+    User = get_user_model()
+    users = User.objects.bulk_create([User(username=f"benchmark-{i}") for i in range(participants)])
+    return SyntheticContest(quiz, questions, users)
+
+
+def _answer(rng, question, skill):
+    question_id, q_type, option_ids, correct_ids, integer_answer = question
+    right = rng.random() < skill
+    answer = {"question": question_id, "time_taken": round(rng.uniform(5, 90), 1)}
+    if q_type == Question.TYPE_INTEGER:
+        answer["submitted_value"] = str(integer_answer if right else integer_answer + 1)
+    elif right:
+        answer["selected_options"] = correct_ids
+    else:
+        answer["selected_options"] = [rng.choice([o for o in option_ids if o not in correct_ids] or option_ids)]
+    return answer
+
+
+def build_timeline(contest, duration=60.0, poll_every=5, seed=0):
+    """
+    A live round: every participant joins during the first tenth of `duration`,
+    starts the quiz, then fetches and answers the questions in order, polling
+    the standings after every `poll_every` answers. Returns trace events sorted by t.
+    """
+    rng = random.Random(seed)
+    n = len(contest.questions)
+    events = []
+
+    def event(t, user, method, path, endpoint, body=None):
+        events.append({"t": round(t, 3), "user": user, "method": method, "path": path,
+                       "body": body, "endpoint": endpoint})
+
+    for user in range(len(contest.users)):
+        skill = rng.uniform(0.2, 0.9)
+        t = rng.uniform(0, duration / 10)
+        step = (duration - t) / (n + 1)
+        event(t, user, "GET", "/contest/Quizzes/{quiz}/start/", "quiz-start")
+        for number, question in enumerate(contest.questions, start=1):
+            t += rng.uniform(0.5, 1.5) * step / 2
+            event(t, user, "GET", f"/contest/Quizzes/{{quiz}}/question/{number}/", "quiz-question")
+            t += rng.uniform(0.5, 1.5) * step / 2
+            event(t, user, "POST", "/contest/Quizzes/{quiz}/submit/", "quiz-submit",
+                  {"answers": [_answer(rng, question, skill)]})
+            if poll_every and number % poll_every == 0:
+                event(t + 0.1, user, "GET", "/contest/Quizzes/{quiz}/standings/top/?k=50", "standings-top")
+
+    events.sort(key=lambda e: e["t"])
+    return events
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_trace(events, path):
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+
+def endpoint_name(path):
+    try:
+        return resolve(urlsplit(path).path).url_name or "unnamed"
+    except Resolver404:
+        return "not-found"
+
+
+class _QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def session_cookies(users):
+    """user index -> session id, so workers can act as any participant without logging in per request."""
+    client = Client()
+    cookies = {}
+    for i, user in enumerate(users):
+        client.force_login(user)
+        cookies[i] = client.cookies[settings.SESSION_COOKIE_NAME].value
+        client.cookies.clear()
+    return cookies
+
+
+class _TestClientTransport:
+    """
+    Requests go through the Django test client in the worker thread, as HTTPS
+    (secure=True): with SECURE_SSL_REDIRECT every plain request is a 301.
+    """
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, method, path, body, session):
+        self.client.cookies.clear()
+        if session:
+            self.client.cookies[settings.SESSION_COOKIE_NAME] = session
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            if method == "POST":
+                response = self.client.post(path, body or {}, content_type="application/json", secure=True,
+                                            HTTP_ACCEPT="application/json")
+            else:
+                response = self.client.get(path, secure=True, HTTP_ACCEPT="application/json")
+        return response.status_code, len(response.content), counter.count
+
+
+class _HTTPTransport:
+    """Requests go over HTTP to a server started by serve(); it reports queries in a header."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.csrf_token = secrets.token_hex(16)   # a real server checks CSRF on session-authenticated writes
+
+    def send(self, method, path, body, session):
+        # the server treats every request as HTTPS (see serve()); a secure POST
+        # without a matching Origin (or Referer) fails the CSRF check
+        headers = {"Accept": "application/json", "Host": "testserver", "Origin": "https://testserver"}
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_token}
+        if session:
+            cookies[settings.SESSION_COOKIE_NAME] = session
+        headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        data = None
+        if method == "POST":
+            data = json.dumps(body or {}).encode()
+            headers["Content-Type"] = "application/json"
+            headers["X-CSRFToken"] = self.csrf_token
+        request = Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urlopen(request) as response:
+                return response.status, len(response.read()), int(response.headers.get(QUERY_COUNT_HEADER, 0))
+        except HTTPError as error:
+            return error.code, len(error.read()), int(error.headers.get(QUERY_COUNT_HEADER, 0))
+
+
+def counting_wsgi_app(application):
+    """Wrap a WSGI app so every response carries the number of queries it ran."""
+    def app(environ, start_response):
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            def counted_start_response(status, headers, exc_info=None):
+                return start_response(status, [*headers, (QUERY_COUNT_HEADER, str(counter.count))], exc_info)
+            return application(environ, counted_start_response)
+    return app
+
+
+def _as_https(application):
+    """Mark every request as HTTPS, like a TLS-terminating proxy would (SECURE_SSL_REDIRECT)."""
+    def app(environ, start_response):
+        environ["wsgi.url_scheme"] = "https"
+        return application(environ, start_response)
+    return app
+
+
+def serve(host="127.0.0.1", port=0):
+    """
+    Threaded WSGI server for the project in a daemon thread; returns (server, base url).
+    It speaks plain HTTP but hands every request to Django as HTTPS.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=True)
+    server.set_app(_as_https(counting_wsgi_app(WSGIHandler())))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def replay(events, quiz_id, cookies, workers=8, speed=0.0, base_url=None):
+    """
+    Send the events with `workers` threads, in timeline order. speed=0 sends
+    as fast as the workers allow; speed=1 keeps the recorded pacing, 2 twice
+    as fast, and so on. Returns (samples, wall seconds, exceptions); each
+    sample is (endpoint, status, seconds, response bytes, queries) and
+    exceptions counts the unhandled exceptions behind 500s by
+    "ExceptionClass: message".
+    """
+    pending = queue.Queue()
+    for event in events:
+        pending.put(event)
+
+    samples, lock = [], threading.Lock()
+    exceptions = Counter()
+
+    def record_exception(sender, **kwargs):
+        # sent from inside the handler's except block, in whichever thread served the request
+        exc = sys.exc_info()[1]
+        if exc is not None:
+            with lock:
+                exceptions[f"{type(exc).__name__}: {exc}"] += 1
+
+    got_request_exception.connect(record_exception, weak=False)
+    started = time.perf_counter()
+
+    def work():
+        transport = _HTTPTransport(base_url) if base_url else _TestClientTransport()
+        try:
+            while True:
+                try:
+                    event = pending.get_nowait()
+                except queue.Empty:
+                    return
+                if speed:
+                    delay = started + event["t"] / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                path = event["path"].replace("{quiz}", str(quiz_id))
+                user = event.get("user")
+                t0 = time.perf_counter()
+                status, size, queries = transport.send(event.get("method", "GET"), path, event.get("body"),
+                                                       cookies.get(user) if user is not None else None)
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    samples.append((event.get("endpoint") or endpoint_name(path), status, elapsed, size, queries))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        got_request_exception.disconnect(record_exception)
+    return samples, time.perf_counter() - started, exceptions
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def is_error(status):
+    """Anything but 2xx: a redirect (e.g. to HTTPS) never reached the endpoint being measured."""
+    return not 200 <= status < 300
+
+
+def _stats(samples, wall):
+    latencies = sorted(s[2] for s in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if is_error(s[1])),
+        "rps": round(len(samples) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "queries_per_request": round(sum(s[4] for s in samples) / len(samples), 2),
+        "max_queries": max(s[4] for s in samples),
+        "bytes_per_request": round(sum(s[3] for s in samples) / len(samples)),
+    }
+
+
+def summarize(samples, wall, exceptions=None):
+    """
+    Overall and per-endpoint statistics; endpoint rps is its share of the
+    whole run. exceptions (from replay) are reported as they are.
+    """
+    by_endpoint = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    for sample in samples:
+        by_endpoint[sample[0]].append(sample)
+        statuses[sample[0]][sample[1]] += 1
+
+    endpoints = {}
+    for name, rows in sorted(by_endpoint.items()):
+        endpoints[name] = {**_stats(rows, wall), "statuses": dict(sorted(statuses[name].items()))}
+    return {"wall_seconds": round(wall, 3), "total": _stats(samples, wall) if samples else {}, "endpoints": endpoints,
+            "exceptions": dict((exceptions or Counter()).most_common())}
@@ -0,0 +1,79 @@
+"""
+Question embargo: the questions of the next hidden quiz stay out of the public
+question bank until that quiz is made visible.
+
+The embargoed ids are computed by one query and cached in the "quiz" cache
+alias under a version number. contest.signals bumps the version whenever a
+Quiz or QuizQuestion row changes and the old entry simply stops being used.
+Other worker processes only see the bump through a shared backend
+(QUIZ_CACHE_BACKEND=file/db/redis, required by config.settings_production);
+with the development locmem backend the version and the set expire after
+QUIZ_CACHE_LOCAL_TIMEOUT seconds, so a second process is stale for at most that long.
+"""
+import time
+
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef, Subquery
+
+from .metrics import record_cache_lookup
+from .models import Quiz, QuizQuestion
+
+
+CACHE_ALIAS = "quiz"
+VERSION_KEY = "embargo:version"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def next_hidden_quiz():
+    """The latest hidden quiz that has questions, as a one-row queryset."""
+    return (Quiz.objects
+            .filter(is_visible__in=[False])   # IN, not NOT is_visible, so the (is_visible, id) index is used
+            .filter(Exists(QuizQuestion.objects.filter(quiz_id=OuterRef("pk"))))
+            .order_by("-id")[:1])
+
+
+def load_embargoed_ids():
+    """One query: question ids of the next hidden quiz."""
+    return frozenset(QuizQuestion.objects
+                     .filter(quiz_id=Subquery(next_hidden_quiz().values("id")))
+                     .values_list("question_id", flat=True))
+
+
+def embargo_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock, not 1: if the counter was evicted, an old
+        # entry cached under a small version number must not come back
+        cache.add(VERSION_KEY, time.time_ns())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def embargoed_question_ids():
+    """Cached load_embargoed_ids(); a hit costs no queries."""
+    cache = _cache()
+    key = f"embargo:{embargo_version()}:ids"
+    ids = cache.get(key)
+    record_cache_lookup("embargo", ids is not None)
+    if ids is None:
+        ids = load_embargoed_ids()
+        cache.set(key, ids)
+    return ids
+
+
+def exclude_embargoed(queryset):
+    """Question queryset without the embargoed questions (NOT IN a short id list; no extra query)."""
+    ids = embargoed_question_ids()
+    return queryset.exclude(id__in=sorted(ids)) if ids else queryset
+
+
+def invalidate_embargo():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:   # counter missing: start a fresh one
+        cache.set(VERSION_KEY, time.time_ns())
@@ -0,0 +1,105 @@
+"""
+Question-bank facet counts for quiz setters: how many questions match the
+current filters, broken down by subject, chapter, level and type.
+
+One grouped query over (subject, chapter, level, type) - a few dozen rows at
+most - is rolled up into all four facets in Python. Results are cached in the
+"quiz" alias per filter combination, keyed by the bank version (bumped by
+contest.signals whenever a Question or Chapter changes) and, for non-staff
+callers, the embargo version, so a cached count never outlives the rows or
+the embargo it was computed under. A hit costs no queries.
+"""
+import hashlib
+import json
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.db.models import Count
+
+from .embargo import embargo_version
+from .metrics import record_cache_lookup
+from .models import Question
+
+
+CACHE_ALIAS = "quiz"
+VERSION_KEY = "facets:version"
+TIMEOUT = 600   # one entry per filter combination; let unused ones age out
+
+GROUP_BY = ("subject", "level", "type", "chapter_id", "chapter__title")
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def bank_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # from the clock, as in contest.embargo: an evicted counter must not revive old entries
+        cache.add(VERSION_KEY, time.time_ns())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_facets():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns())
+
+
+def _key(filters, embargoed):
+    # every QuestionFilter lookup is case-insensitive, and so is search
+    normalized = sorted((name, value.strip().lower()) for name, value in filters.items() if value and value.strip())
+    digest = hashlib.sha1(json.dumps(normalized).encode()).hexdigest()
+    scope = embargo_version() if embargoed else "all"
+    return f"facets:{bank_version()}:{scope}:{digest}"
+
+
+def count_facets(queryset):
+    """The facets of a Question queryset, from one grouped query."""
+    rows = queryset.order_by().values(*GROUP_BY).annotate(n=Count("id"))
+
+    total = 0
+    subjects, levels, types, chapters = Counter(), Counter(), Counter(), Counter()
+    chapter_titles = {}
+    for row in rows:
+        n = row["n"]
+        total += n
+        subjects[row["subject"]] += n
+        levels[row["level"]] += n
+        types[row["type"]] += n
+        chapters[row["chapter_id"]] += n
+        chapter_titles[row["chapter_id"]] = row["chapter__title"]
+
+    def by_choice(counts, choices):
+        # every choice listed, zeros included, so a setter sees what is missing
+        return [{"value": value, "label": label, "count": counts[value]} for value, label in choices]
+
+    return {
+        "total": total,
+        "subject": by_choice(subjects, Question.SUBJECT_CHOICE),
+        "level": by_choice(levels, Question.LEVEL_CHOICES),
+        "type": by_choice(types, Question.TYPE_CHOICES),
+        "chapter": [{"id": chapter_id, "title": chapter_titles[chapter_id], "count": n}
+                    for chapter_id, n in sorted(chapters.items(), key=lambda item: (-item[1], item[0] or 0))],
+    }
+
+
+def question_facets(filters, embargoed, queryset):
+    """
+    Cached count_facets(). filters are the QuestionFilter params of the
+    request; queryset is a callable building the filtered queryset, only
+    called on a miss.
+    """
+    cache = _cache()
+    key = _key(filters, embargoed)
+    facets = cache.get(key)
+    record_cache_lookup("facets", facets is not None)
+    if facets is None:
+        facets = count_facets(queryset())
+        cache.set(key, facets, timeout=TIMEOUT)
+    return facets
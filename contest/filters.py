@@ -1,6 +1,7 @@
 from django_filters.rest_framework import FilterSet,CharFilter, BooleanFilter
 
-from. models import Chapter, Quiz
+from. models import Chapter, Question, Quiz
+from .search import rank_matching
 
 
 
@@ -24,4 +25,20 @@ class QuizFilter(FilterSet):
     
     
 
- 
\ No newline at end of file
+ 
+
+class QuestionFilter(FilterSet):
+
+    q = CharFilter(method='search', label='Search')
+    subject = CharFilter(field_name='subject', lookup_expr='iexact')
+    level = CharFilter(field_name='level', lookup_expr='iexact')
+    type = CharFilter(field_name='type', lookup_expr='iexact')
+    chapter = CharFilter(field_name='chapter__title', lookup_expr='iexact')
+
+    class Meta:
+        model = Question
+        fields = ['q', 'subject', 'level', 'type', 'chapter']
+
+    def search(self, queryset, name, value):
+        # full-text match over title and statement, best matches first (contest.search)
+        return rank_matching(queryset, value)
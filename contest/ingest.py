@@ -0,0 +1,87 @@
+from django.db import IntegrityError, transaction
+
+from .aggregation import apply_result_delta, submission_delta
+from .models import Submission
+from .standings import rerank_if_due
+
+
+ATTEMPTS = 3
+
+
+def ingest_answers(user_id, quiz_id, answers, key):
+    """
+    Write a batch of answers of one user and grade them inline.
+
+    answers: validated SubmissionItemSerializer data (question = Question id).
+    key: the quiz's scoring.AnswerKey.
+
+    New answers are bulk_created, re-submitted ones bulk_updated, their
+    selected options rewritten with one DELETE and one bulk INSERT on the M2M
+    table, and the user's result gets a single summed delta - a fixed number
+    of queries per batch. Bulk writes don't send post_save, so the per-row
+    submission receiver stays out of the way.
+    Returns (created, updated) counts.
+
+    Two requests of the same user answering the same new question at once
+    (double click, client retry, two drain workers) both see no row and both
+    insert; the second insert hits unique (user, quiz, question). That batch
+    is rolled back (to a savepoint, inside an outer transaction) and
+    recomputed - now as an update of the row the other one committed, so the
+    result delta stays exact.
+    """
+    for attempt in range(ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _ingest(user_id, quiz_id, answers, key)
+        except IntegrityError:
+            if attempt == ATTEMPTS - 1:
+                raise
+
+
+def _ingest(user_id, quiz_id, answers, key):
+    by_quiz_question = {key.quiz_questions[a["question"]]: a for a in answers}
+    existing = {
+        s.question_id: s
+        # locked (where the backend can), so two re-submits can't both start from the same old points
+        for s in (Submission.objects.select_for_update()
+                  .filter(user_id=user_id, quiz_id=quiz_id, question_id__in=list(by_quiz_question)))
+    }
+
+    created, updated, selected = [], [], {}
+    delta = [0, 0, 0]
+    for qq_id, answer in by_quiz_question.items():
+        selected_ids = set(answer.get("selected_options") or ())
+        points = key.grade(qq_id, selected_ids, answer.get("submitted_value"))
+
+        submission = existing.get(qq_id)
+        old_points = None
+        if submission is None:
+            submission = Submission(user_id=user_id, quiz_id=quiz_id, question_id=qq_id)
+            created.append(submission)
+        else:
+            old_points = submission.points_rewarded
+            updated.append(submission)
+
+        submission.submitted_value = answer.get("submitted_value")
+        submission.time_taken = answer.get("time_taken", 0)
+        submission.points_rewarded = points
+        selected[qq_id] = selected_ids
+
+        for i, change in enumerate(submission_delta(points, old_points)):
+            delta[i] += change
+
+    Submission.objects.bulk_create(created)
+    Submission.objects.bulk_update(updated, ["submitted_value", "time_taken", "points_rewarded"])
+
+    through = Submission.selected_options.through
+    if updated:
+        through.objects.filter(submission_id__in=[s.id for s in updated]).delete()
+    through.objects.bulk_create([
+        through(submission_id=submission.id, questionoption_id=option_id)
+        for submission in created + updated
+        for option_id in selected[submission.question_id]
+    ])
+
+    apply_result_delta(user_id, quiz_id, *delta)
+    rerank_if_due(quiz_id)
+    return len(created), len(updated)
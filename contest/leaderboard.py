@@ -0,0 +1,243 @@
+"""
+In-process leaderboard for active quizzes.
+
+Each board is a sorted array of standing keys (-score, penalties, created_at,
+result id, user id) - the same order as STANDING_ORDER - plus a user -> key map,
+so "rank of user X" and "users at positions a..b" are bisect lookups instead of
+a sort over all results. Updates are a bisect plus one list insert/delete
+(a memmove; no re-sort). QuizStandingViewSet.around reads from it.
+
+Boards live in one process, but results are written by every worker and by
+drain_submissions. Every committed result change of a quiz is therefore
+appended to a LeaderboardChange log, numbered per quiz; the number is the
+quiz's results version. The unique (quiz, version) constraint makes taking a
+number atomic on every database, which cache.incr isn't on the file and db
+cache backends. A board remembers the version it is current for:
+
+- a process that committed a change logs it and, if its board was current
+  just before, re-reads the changed row and sets it on the board - an
+  idempotent absolute write, never a delta, so it can't double-count;
+- on every read, get_leaderboard() asks the log for the changes after the
+  board's version (one indexed query; usually none) and re-reads just those
+  users' rows. Only a wholesale change, or a board further behind than the
+  log keeps, reloads the whole board.
+
+Nothing touches a board before commit, so a rolled-back transaction can't
+leave it out of step with the database.
+"""
+import threading
+from bisect import bisect_left, insort
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import LeaderboardChange, UserQuizResult
+
+
+ATTEMPTS = 10          # writers racing for the same version number
+KEEP_CHANGES = 1000    # log entries kept per quiz; a board further behind reloads
+
+
+class Leaderboard:
+
+    def __init__(self, quiz_id, rows=(), version=None):
+        """rows: (user_id, score, penalties, created_at, result_id) tuples."""
+        self.quiz_id = quiz_id
+        self.version = version
+        self._lock = threading.Lock()
+        self._by_user = {
+            user_id: (-score, penalties, created_at, result_id, user_id)
+            for user_id, score, penalties, created_at, result_id in rows
+        }
+        self._keys = sorted(self._by_user.values())
+
+    @classmethod
+    def load(cls, quiz_id, version=None):
+        from .standings import standing_results
+        rows = standing_results(quiz_id).values_list("user_id", "score", "penalties", "created_at", "id")
+        return cls(quiz_id, rows, version)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, user_id):
+        return user_id in self._by_user
+
+    def _remove(self, user_id):
+        key = self._by_user.pop(user_id, None)
+        if key is not None:
+            del self._keys[bisect_left(self._keys, key)]
+        return key
+
+    def _set(self, user_id, score, penalties, created_at, result_id):
+        self._remove(user_id)
+        key = (-score, penalties, created_at, result_id, user_id)
+        self._by_user[user_id] = key
+        insort(self._keys, key)
+
+    def set(self, user_id, score, penalties, created_at, result_id):
+        with self._lock:
+            self._set(user_id, score, penalties, created_at, result_id)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def advance(self, since, version, rows):
+        """
+        Move the board from version `since` to `version` by writing the
+        committed rows of the users changed in between (user_id -> row, None:
+        no longer listed). False, untouched, if the board isn't at `since` -
+        another thread moved it, or it must reload.
+        """
+        with self._lock:
+            if self.version is None or self.version != since:
+                return False
+            for user_id, row in rows.items():
+                if row is None:
+                    self._remove(user_id)
+                else:
+                    self._set(user_id, *row)
+            self.version = version
+            return True
+
+    def rank_of(self, user_id, method="competition"):
+        """
+        Rank by standings.RANK_FUNCTIONS method, or None. "competition" and
+        "ordinal" are bisect lookups; "dense" counts the distinct
+        (score, penalties) pairs above, which is linear.
+        """
+        with self._lock:
+            key = self._by_user.get(user_id)
+            if key is None:
+                return None
+            if method == "ordinal":
+                return bisect_left(self._keys, key) + 1
+            # a 2-tuple sorts before every 5-tuple starting with it
+            above = bisect_left(self._keys, key[:2])
+            if method == "dense":
+                return len({k[:2] for k in self._keys[:above]}) + 1
+            return above + 1
+
+    def position_of(self, user_id):
+        """1-based position in standings order (ties broken by join time, id), or None."""
+        with self._lock:
+            key = self._by_user.get(user_id)
+            return None if key is None else bisect_left(self._keys, key) + 1
+
+    def users_between(self, a, b):
+        """User ids at positions a..b (1-based, inclusive)."""
+        with self._lock:
+            return [key[4] for key in self._keys[max(a, 1) - 1:b]]
+
+    def verify(self):
+        """
+        Compare the board, key by key (score, penalties, join time, result and
+        user id), with the SQL standings; returns the positions (1-based) where
+        they disagree - an empty list means it's consistent.
+        """
+        from .standings import STANDING_ORDER, standing_results
+        expected = [
+            (-score, penalties, created_at, result_id, user_id)
+            for score, penalties, created_at, result_id, user_id in (
+                standing_results(self.quiz_id).order_by(*STANDING_ORDER)
+                .values_list("score", "penalties", "created_at", "id", "user_id"))
+        ]
+        with self._lock:
+            actual = list(self._keys)
+        mismatches = [i for i, (a, b) in enumerate(zip(actual, expected), start=1) if a != b]
+        if len(actual) != len(expected):
+            mismatches.append(min(len(actual), len(expected)) + 1)
+        return mismatches
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+def results_version(quiz_id):
+    """Version of the quiz's last committed result change; 0 before the first."""
+    return LeaderboardChange.objects.filter(quiz_id=quiz_id).aggregate(version=Max("version"))["version"] or 0
+
+
+def _log_change(quiz_id, user_id):
+    """Append a committed change to the quiz's log; returns its version."""
+    for attempt in range(ATTEMPTS):
+        version = results_version(quiz_id) + 1
+        try:
+            with transaction.atomic():
+                LeaderboardChange.objects.create(quiz_id=quiz_id, version=version, user_id=user_id)
+            break
+        except IntegrityError:
+            # another writer took this number first; on Postgres the insert
+            # waited for its commit, so the next read of the max sees it
+            if attempt == ATTEMPTS - 1:
+                raise
+    if version % KEEP_CHANGES == 0:
+        LeaderboardChange.objects.filter(quiz_id=quiz_id, version__lte=version - KEEP_CHANGES).delete()
+    return version
+
+
+def _committed_rows(quiz_id, user_ids):
+    """user_id -> board row of each listed result; users without one (or DQ) are left out."""
+    rows = (UserQuizResult.objects
+            .filter(user_id__in=user_ids, quiz_id=quiz_id, is_virtual=False)
+            .exclude(status=UserQuizResult.Status.DISQUALIFIED)
+            .values_list("user_id", "score", "penalties", "created_at", "id"))
+    return {user_id: row for user_id, *row in rows}
+
+
+def _catch_up(board):
+    """Bring a board up to the log; False if it has to be reloaded instead."""
+    since = board.version
+    # from the board's own version on: if that entry is gone (pruned, or the
+    # log was reset under the board) the changes in between are unknown
+    changes = list(LeaderboardChange.objects
+                   .filter(quiz_id=board.quiz_id, version__gte=since)
+                   .order_by("version")
+                   .values_list("version", "user_id"))
+    if since:
+        if not changes or changes[0][0] != since:
+            return False
+        changes = changes[1:]
+    if not changes:
+        return True
+    if changes[0][0] != since + 1 or any(user_id is None for _, user_id in changes):
+        return False   # a wholesale change
+    user_ids = {user_id for _, user_id in changes}
+    rows = _committed_rows(board.quiz_id, user_ids)
+    board.advance(since, changes[-1][0], {user_id: rows.get(user_id) for user_id in user_ids})
+    return True
+
+
+def get_leaderboard(quiz_id):
+    """The quiz's board, brought up to date with the changes other processes committed."""
+    board = _boards.get(quiz_id)
+    if board is not None and _catch_up(board):
+        return board
+    with _boards_lock:
+        if _boards.get(quiz_id) is not board:
+            return _boards[quiz_id]   # another thread reloaded it meanwhile
+        version = results_version(quiz_id)   # read before loading: a change racing the load is re-applied later
+        board = _boards[quiz_id] = Leaderboard.load(quiz_id, version)
+    return board
+
+
+def invalidate_leaderboard(quiz_id):
+    """Results of the quiz changed wholesale: every process reloads its board on next use."""
+    _log_change(quiz_id, None)
+    _boards.pop(quiz_id, None)
+
+
+def _track_committed_result(user_id, quiz_id):
+    version = _log_change(quiz_id, user_id)
+    board = _boards.get(quiz_id)
+    if board is None or board.version != version - 1:
+        return   # no board here, or it is behind: it catches up on next use
+    rows = _committed_rows(quiz_id, [user_id])
+    board.advance(version - 1, version, {user_id: rows.get(user_id)})
+
+
+def track_result_delta(user_id, quiz_id):
+    """Keep boards in step with a result update, once (and only if) the transaction commits."""
+    transaction.on_commit(lambda: _track_committed_result(user_id, quiz_id), robust=True)
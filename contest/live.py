@@ -0,0 +1,139 @@
+"""
+In-process publisher for the live standings stream (ASGI only).
+
+Every subscriber of a quiz gets a bounded asyncio.Queue. While a quiz has at
+least one subscriber, the publisher reads its top standings once per tick
+(LIVE_STANDINGS_TICK_SECONDS), diffs them against the previous tick and puts
+the changed rows on every queue - one query per quiz per tick no matter how
+many clients are connected, and several result updates inside a tick go out
+as a single delta.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .standings import rerank_pending, standing_results, standings_after
+
+
+logger = logging.getLogger(__name__)
+
+ROW_FIELDS = ("user_id", "user__username", "rank", "score", "penalties", "correct_answers")
+
+
+def fetch_standings(quiz_id, limit):
+    rerank_pending(quiz_id)
+    rows = standings_after(standing_results(quiz_id).values(*ROW_FIELDS), limit)
+    return {
+        row["user_id"]: {
+            "user_id": row["user_id"],
+            "username": row["user__username"],
+            "rank": row["rank"],
+            "score": row["score"],
+            "penalties": row["penalties"],
+            "correct_answers": row["correct_answers"],
+        }
+        for row in rows
+    }
+
+
+def diff_standings(previous, current):
+    changed = [row for user_id, row in current.items() if previous.get(user_id) != row]
+    removed = [user_id for user_id in previous if user_id not in current]
+    return {"changed": sorted(changed, key=standing_position), "removed": removed}
+
+
+def standing_position(row):
+    # rows not ranked yet (rank None) go last; sorted() keeps their fetch order
+    return row["rank"] is None, row["rank"] or 0
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class StandingsPublisher:
+
+    QUEUE_SIZE = 32
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)   # quiz_id -> {asyncio.Queue}
+        self._snapshots = {}                    # quiz_id -> {user_id: row}
+        self._task = None
+
+    @property
+    def tick(self):
+        return getattr(settings, "LIVE_STANDINGS_TICK_SECONDS", 1.0)
+
+    @property
+    def limit(self):
+        return getattr(settings, "LIVE_STANDINGS_SIZE", 200)
+
+    async def subscribe(self, quiz_id):
+        """Register a subscriber; its queue starts with a full snapshot event."""
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        if quiz_id not in self._snapshots:
+            self._snapshots[quiz_id] = await sync_to_async(fetch_standings)(quiz_id, self.limit)
+        queue.put_nowait(sse_event("snapshot", sorted(self._snapshots[quiz_id].values(), key=standing_position)))
+        self._subscribers[quiz_id].add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, quiz_id, queue):
+        subscribers = self._subscribers.get(quiz_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[quiz_id]
+            self._snapshots.pop(quiz_id, None)
+
+    async def _run(self):
+        while self._subscribers:
+            await asyncio.sleep(self.tick)
+            for quiz_id in list(self._subscribers):
+                try:
+                    await self._publish(quiz_id)
+                except Exception:
+                    # one failed read (database down, lock timeout) must not end the stream for everyone
+                    logger.exception("live standings: publishing quiz %s failed", quiz_id)
+
+    async def _publish(self, quiz_id):
+        current = await sync_to_async(fetch_standings)(quiz_id, self.limit)
+        if quiz_id not in self._subscribers:
+            return   # last subscriber left while we were querying
+        delta = diff_standings(self._snapshots.get(quiz_id, {}), current)
+        self._snapshots[quiz_id] = current
+        if not delta["changed"] and not delta["removed"]:
+            return
+
+        event = sse_event("delta", delta)
+        for queue in self._subscribers[quiz_id]:
+            if queue.full():
+                # slow client: drop its backlog and resend the whole board
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(sse_event("snapshot", sorted(current.values(), key=standing_position)))
+            else:
+                queue.put_nowait(event)
+
+
+publisher = StandingsPublisher()
+
+
+async def stream_standings(quiz_id, heartbeat=15.0):
+    """Async iterator of SSE messages for one client."""
+    queue = await publisher.subscribe(quiz_id)
+    try:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"   # comment line keeps proxies from closing an idle stream
+    finally:
+        publisher.unsubscribe(quiz_id, queue)
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from contest import benchmark
+from contest.models import Question
+
+
+TYPE_NAMES = {"SCQ": Question.TYPE_SINGLE, "MCQ": Question.TYPE_MULTI, "INT": Question.TYPE_INTEGER}
+
+
+def parse_types(value):
+    """"SCQ=6,MCQ=2,INT=2" -> {type: weight}."""
+    types = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip().upper() not in TYPE_NAMES:
+            raise CommandError(f"Unknown question type {name!r}, expected SCQ, MCQ or INT")
+        types[TYPE_NAMES[name.strip().upper()]] = float(weight or 1)
+    return types
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a live contest on a throwaway test database and report p50/p95/p99 latency, "
+        "requests/sec and DB queries per request for each endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participants", type=int, default=200)
+        parser.add_argument("--questions", type=int, default=20)
+        parser.add_argument("--options", type=int, default=4, help="Options per SCQ/MCQ question.")
+        parser.add_argument("--types", default="SCQ", type=parse_types,
+                            help='Question type mix with weights, e.g. "SCQ=6,MCQ=2,INT=2".')
+        parser.add_argument("--duration", type=float, default=60.0, help="Length of the simulated round in seconds.")
+        parser.add_argument("--poll-every", type=int, default=5, help="Standings poll after every N answers (0: never).")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent client threads.")
+        parser.add_argument("--speed", type=float, default=0.0,
+                            help="Replay pacing: 0 as fast as possible, 1 real time, 2 twice as fast...")
+        parser.add_argument("--server", action="store_true",
+                            help="Send requests over HTTP to a threaded WSGI server instead of the test client.")
+        parser.add_argument("--trace", help="Replay this JSONL trace instead of the generated timeline.")
+        parser.add_argument("--write-trace", help="Save the timeline that was replayed as JSONL.")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--max-error-rate", type=float, default=0.01,
+                            help="Abort without latency figures when more than this share of requests is not 2xx.")
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        if options["verbosity"] < 2:
+            # failed requests are counted in the report; -v 2 shows their tracebacks
+            logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        test_db = connection.settings_dict.setdefault("TEST", {})
+        db_file, configured_name = None, test_db.get("NAME")
+        if connection.vendor == "sqlite":
+            # worker threads need a shared file; the in-memory test DB can't take concurrent writers.
+            # Always a file of its own: the configured test DB may belong to a test run going on right now.
+            fd, db_file = tempfile.mkstemp(prefix="benchmark-", suffix=".sqlite3")
+            os.close(fd)
+            test_db["NAME"] = db_file
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if db_file:
+                test_db["NAME"] = configured_name
+                if os.path.exists(db_file):
+                    os.remove(db_file)
+
+        self._check_errors(report, options["max_error_rate"])
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stdout.write(self._table(report))
+        else:
+            self.stdout.write(output)
+
+    def _run(self, options):
+        contest = benchmark.build_contest(
+            participants=options["participants"], questions=options["questions"],
+            options=options["options"], types=options["types"], seed=options["seed"],
+        )
+        if options["trace"]:
+            events = benchmark.read_trace(options["trace"])
+        else:
+            events = benchmark.build_timeline(contest, duration=options["duration"],
+                                              poll_every=options["poll_every"], seed=options["seed"])
+        if options["write_trace"]:
+            benchmark.write_trace(events, options["write_trace"])
+
+        cookies = benchmark.session_cookies(contest.users)
+        server = base_url = None
+        if options["server"]:
+            server, base_url = benchmark.serve()
+        try:
+            samples, wall, exceptions = benchmark.replay(events, contest.quiz.id, cookies, workers=options["workers"],
+                                                         speed=options["speed"], base_url=base_url)
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        return {
+            "commit": _git_commit(),
+            "database": connection.vendor,
+            "transport": "wsgi-server" if options["server"] else "test-client",
+            "config": {key: options[key] for key in (
+                "participants", "questions", "options", "duration", "poll_every", "workers", "speed", "seed", "trace",
+            )} | {"types": options["types"]},
+            **benchmark.summarize(samples, wall, exceptions),
+        }
+
+    def _check_errors(self, report, max_error_rate):
+        """Latencies of failed requests measure the failure, not the endpoint: refuse to report them."""
+        total = report["total"]
+        if not total or not total["errors"]:
+            return
+        statuses = defaultdict(int)
+        for endpoint in report["endpoints"].values():
+            for status, count in endpoint["statuses"].items():
+                if benchmark.is_error(status):
+                    statuses[status] += count
+        message = (f"{total['errors']} of {total['requests']} requests were not 2xx "
+                   f"(status: count {dict(sorted(statuses.items()))})")
+        locked = sum(count for name, count in report["exceptions"].items() if "database is locked" in name)
+        if locked:
+            message += (f"; {locked} failed with \"database is locked\": SQLite writers are colliding. Use "
+                        f"IMMEDIATE transactions with a busy timeout (as the project settings do), Postgres, "
+                        f"or fewer --workers")
+        elif report["exceptions"]:
+            message += f"; most common exception: {next(iter(report['exceptions']))}"
+        if total["errors"] > max_error_rate * total["requests"]:
+            raise CommandError(message + ". Latency figures would be meaningless; not reporting them.")
+        self.stderr.write(self.style.WARNING("WARNING: " + message))
+
+    def _table(self, report):
+        lines = [f"{'endpoint':<24}{'reqs':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>8}"]
+        rows = [*report["endpoints"].items(), ("total", report["total"])]
+        for name, s in rows:
+            if not s:
+                continue
+            lines.append(f"{name:<24}{s['requests']:>8}{s['errors']:>6}{s['rps']:>9}"
+                         f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['queries_per_request']:>8}")
+        return "\n".join(lines)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,61 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from contest.submission_queue import drain_batch, queue_stats, requeue_failed
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ("Worker for the write-behind submission queue: grade and apply queued answer batches. "
+            "Several workers can run in parallel only on a database with SKIP LOCKED (PostgreSQL).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Queued rows claimed per transaction.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain until the queue is empty, then exit.")
+        parser.add_argument("--stats", action="store_true", help="Print queue depth and lag, then exit.")
+        parser.add_argument("--requeue-failed", action="store_true",
+                            help="Put parked rows (failed too often) back in the queue, then exit.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self._print_stats()
+            return
+        if options["requeue_failed"]:
+            self.stdout.write(f"requeued {requeue_failed()} row(s)")
+            return
+
+        if not connection.features.has_select_for_update_skip_locked:
+            self.stderr.write(f"{connection.vendor} has no SKIP LOCKED: run only one drain_submissions worker")
+
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    processed = drain_batch(options["batch_size"])
+                except Exception:
+                    # the batch was rolled back and stays queued; a bad group is parked by drain_batch itself
+                    if options["once"]:
+                        raise
+                    logger.exception("drain: batch failed, retrying in %ss", options["interval"])
+                    time.sleep(options["interval"])
+                    continue
+                if processed:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"ingested {processed} batch(es) in {elapsed:.3f}s")
+                    self._print_stats()
+                    continue
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("stopped")
+
+    def _print_stats(self):
+        stats = queue_stats()
+        self.stdout.write(f"queue depth={stats['depth']} lag={stats['lag_seconds']}s failed={stats['failed']}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from contest.aggregation import reconcile_results
+
+
+class Command(BaseCommand):
+    help = "Verify incrementally maintained UserQuizResult totals against a full recompute from submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quiz", type=int, help="Only reconcile this quiz id.")
+        parser.add_argument("--fix", action="store_true", help="Rewrite mismatching rows with the recomputed totals.")
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_results(quiz_id=options["quiz"], fix=options["fix"])
+
+        for user_id, quiz_id, stored, expected in mismatches:
+            self.stdout.write(f"quiz={quiz_id} user={user_id} stored={stored} expected={expected}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All results match their submissions."))
+        elif options["fix"]:
+            self.stdout.write(self.style.WARNING(f"Fixed {len(mismatches)} result(s)."))
+        else:
+            self.stdout.write(self.style.ERROR(f"{len(mismatches)} result(s) out of sync; rerun with --fix."))
@@ -0,0 +1,211 @@
+"""
+Per-request metrics for production, in place of debug_toolbar.
+
+MetricsMiddleware keys every request by its view - "QuizViewSet.question" for
+DRF viewsets and actions, the class name or URL name for other views - and
+records a latency histogram, a status class counter and response bytes.
+METRICS_SAMPLE_RATE of the requests additionally get their DB queries counted
+and timed through a connection.execute_wrapper; that wrapper runs on every
+query, so it is the only part that is sampled. record_cache_lookup() counts
+hits and misses of the caches in front of the hot endpoints.
+
+Counters live in this process. metrics_view serves them in the Prometheus text
+format (each worker process exposes its own, like any multi-process Prometheus
+target), and with METRICS_FILE set they are also written to that file at most
+every METRICS_DUMP_SECONDS.
+"""
+import hmac
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _DBTimer:
+    """execute_wrapper counting the queries of one request and their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))   # (view, method) -> counts, last is +Inf
+            self.latency_sum = defaultdict(float)                                   # (view, method) -> seconds
+            self.responses = defaultdict(int)                                       # (view, method, "2xx") -> n
+            self.response_bytes = defaultdict(int)                                  # view -> bytes
+            self.db_sampled = defaultdict(int)                                      # view -> sampled requests
+            self.db_queries = defaultdict(int)                                      # view -> queries in sampled requests
+            self.db_seconds = defaultdict(float)                                    # view -> query time in sampled requests
+            self.cache_lookups = defaultdict(int)                                   # (cache, "hit"/"miss") -> n
+
+    def observe(self, view, method, status, seconds, size=None, db=None):
+        with self._lock:
+            self.buckets[view, method][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum[view, method] += seconds
+            self.responses[view, method, f"{status // 100}xx"] += 1
+            if size is not None:
+                self.response_bytes[view] += size
+            if db is not None:
+                self.db_sampled[view] += 1
+                self.db_queries[view] += db.queries
+                self.db_seconds[view] += db.seconds
+
+    def cache_lookup(self, cache, hit):
+        with self._lock:
+            self.cache_lookups[cache, "hit" if hit else "miss"] += 1
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4."""
+        with self._lock:
+            lines = [
+                "# HELP blitz_request_duration_seconds Request latency by view.",
+                "# TYPE blitz_request_duration_seconds histogram",
+            ]
+            for (view, method), counts in sorted(self.buckets.items()):
+                labels = f'view="{view}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f'blitz_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"blitz_request_duration_seconds_sum{{{labels}}} {self.latency_sum[view, method]:.6f}")
+                lines.append(f"blitz_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+            lines += _counter("blitz_responses_total", "Responses by view and status class.",
+                              {f'view="{v}",method="{m}",status="{s}"': n for (v, m, s), n in self.responses.items()})
+            lines += _counter("blitz_response_bytes_total", "Response body bytes by view (streaming responses excluded).",
+                              {f'view="{v}"': n for v, n in self.response_bytes.items()})
+            lines += _counter("blitz_db_sampled_requests_total", "Requests whose DB queries were measured.",
+                              {f'view="{v}"': n for v, n in self.db_sampled.items()})
+            lines += _counter("blitz_db_queries_total", "DB queries run by sampled requests.",
+                              {f'view="{v}"': n for v, n in self.db_queries.items()})
+            lines += _counter("blitz_db_query_seconds_total", "Time spent in DB queries by sampled requests.",
+                              {f'view="{v}"': f"{s:.6f}" for v, s in self.db_seconds.items()})
+            lines += _counter("blitz_cache_lookups_total", "Cache lookups by cache and result.",
+                              {f'cache="{c}",result="{r}"': n for (c, r), n in self.cache_lookups.items()})
+        return "\n".join(lines) + "\n"
+
+
+def _counter(name, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines += [f"{name}{{{labels}}} {value}" for labels, value in sorted(samples.items())]
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def record_cache_lookup(cache, hit):
+    registry.cache_lookup(cache, hit)
+
+
+def view_name(request, view_func):
+    """
+    "QuizViewSet.question" for DRF viewset routes, the class name for other
+    class-based views, the URL name (e.g. "admin:index") for function views.
+    """
+    cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if cls is None:
+        match = request.resolver_match
+        return (match and match.view_name) or getattr(view_func, "__qualname__", type(view_func).__name__)
+    action = (getattr(view_func, "actions", None) or {}).get(request.method.lower())
+    return f"{cls.__name__}.{action}" if action else cls.__name__
+
+
+class MetricsMiddleware:
+    """Put it right after SecurityMiddleware so the latency covers the rest of the stack."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "METRICS_SAMPLE_RATE", 1.0)
+        self.dump_file = getattr(settings, "METRICS_FILE", None)
+        self.dump_seconds = getattr(settings, "METRICS_DUMP_SECONDS", 60)
+        self._next_dump = time.monotonic() + self.dump_seconds
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        db = _DBTimer() if random.random() < self.sample_rate else None
+        with ExitStack() as stack:
+            if db is not None:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(db))
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, db)
+        return response
+
+    async def __acall__(self, request):
+        # async views reach the ORM through sync_to_async threads; only latency is recorded
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(request, view_func)
+
+    def _record(self, request, response, seconds, db):
+        size = None if response.streaming else len(response.content)
+        registry.observe(getattr(request, "metrics_view", "unresolved"), request.method,
+                         response.status_code, seconds, size, db)
+        if self.dump_file and time.monotonic() >= self._next_dump:
+            self._next_dump = time.monotonic() + self.dump_seconds
+            dump(self.dump_file)
+
+
+def dump(path):
+    """Write the current metrics to path ("{pid}" is replaced by the process id), atomically."""
+    path = str(path).format(pid=os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape target. With METRICS_TOKEN set it wants
+    "Authorization: Bearer <token>"; without one only staff users may read it.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        # constant time: == would leak how much of the token a guess got right
+        allowed = hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode())
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
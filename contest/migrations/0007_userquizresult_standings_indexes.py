@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0006_rename_solved_count_userquizresult_correct_answers_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userquizresult',
+            index=models.Index(fields=['quiz', 'is_virtual', 'status', '-score', 'penalties'], name='result_standings_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquizresult',
+            index=models.Index(fields=['quiz', 'is_virtual', 'rank'], name='result_rank_idx'),
+        ),
+    ]
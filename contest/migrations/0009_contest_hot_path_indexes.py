@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0008_pendingsubmission'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'level', 'type', 'is_visible'], name='question_browse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['is_visible', 'id'], name='quiz_visible_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizquestion',
+            index=models.Index(fields=['quiz', 'order'], name='quizquestion_quiz_order_idx'),
+        ),
+    ]
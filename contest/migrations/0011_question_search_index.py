@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+# Kept in step with contest/search.py (PG_DOCUMENT there qualifies the columns,
+# which doesn't change the indexed expression).
+FTS_TABLE = 'contest_question_search'
+PG_DOCUMENT = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(statement, ''))"
+
+SQLITE_FORWARD = [
+    # external-content table: the text lives in contest_question, the index only holds tokens
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, statement, content='contest_question', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON contest_question BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, statement) VALUES (new.id, new.title, new.statement);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON contest_question BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, statement) VALUES ('delete', old.id, old.title, old.statement);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, statement ON contest_question BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, statement) VALUES ('delete', old.id, old.title, old.statement);
+        INSERT INTO {FTS_TABLE}(rowid, title, statement) VALUES (new.id, new.title, new.statement);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [f"CREATE INDEX question_search_idx ON contest_question USING GIN (({PG_DOCUMENT}))"]
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS question_search_idx"]
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def _statements(schema_editor, forward):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        return SQLITE_FORWARD if forward else SQLITE_BACKWARD
+    if connection.vendor == 'postgresql':
+        return POSTGRES_FORWARD if forward else POSTGRES_BACKWARD
+    return []   # other backends / SQLite without FTS5: contest.search falls back to LIKE
+
+
+def create_search_index(apps, schema_editor):
+    for sql in _statements(schema_editor, forward=True):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in _statements(schema_editor, forward=False):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0010_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0011_question_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingsubmission',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
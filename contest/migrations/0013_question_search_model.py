@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0012_pending_submission_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSearch',
+            fields=[
+                ('question', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='contest.question')),
+            ],
+            options={
+                'db_table': 'contest_question_search',
+                'managed': False,
+            },
+        ),
+    ]
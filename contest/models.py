@@ -26,6 +26,12 @@ class Quiz(models.Model):
 
     class Meta:
         verbose_name_plural = "Quizzes"
+        indexes = [
+            # "next hidden quiz" lookup (contest.embargo)
+            models.Index(fields=["is_visible", "id"], name="quiz_visible_id_idx"),
+            # keyset pagination of the quiz list (pagination.KeysetPagination)
+            models.Index(fields=["created_at", "id"], name="quiz_created_id_idx"),
+        ]
 
 
     def __str__(self) -> str:
@@ -83,11 +89,35 @@ class Question(models.Model):
                                 through='QuizQuestion',
                                 blank=True
                                 )
+
+    class Meta:
+        indexes = [
+            # question bank browsing by subject / level / type
+            models.Index(fields=["subject", "level", "type", "is_visible"], name="question_browse_idx"),
+            # keyset pagination of the question bank (pagination.KeysetPagination)
+            models.Index(fields=["created_at", "id"], name="question_created_id_idx"),
+        ]
     
     
 
     def __str__(self):
         return f"{self.title} ({self.get_type_display()})"
+
+
+class QuestionSearch(models.Model):
+    """
+    The SQLite FTS5 index of questions (contest_question_search, created by
+    migration 0011 and kept in sync by triggers). Not managed by Django; only
+    here so contest.search can join it - bm25() must run in the MATCH query.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.DO_NOTHING, primary_key=True,
+                                    db_column="rowid", db_constraint=False, related_name="search_entry")
+
+    class Meta:
+        managed = False
+        db_table = "contest_question_search"
+
     
 class QuestionImage(models.Model):
 
@@ -114,6 +144,10 @@ class QuizQuestion(models.Model):
 
     class Meta:
         unique_together = ('quiz','question')
+        indexes = [
+            # ordered question slice of a quiz
+            models.Index(fields=["quiz", "order"], name="quizquestion_quiz_order_idx"),
+        ]
 
 class Submission(models.Model):
 
@@ -167,9 +201,50 @@ class UserQuizResult(models.Model):
                 name="uniq_live_result_per_user_quiz",
             )
         ]
+        indexes = [
+            models.Index(fields=["quiz", "is_virtual", "status", "-score", "penalties"], name="result_standings_idx"),
+            models.Index(fields=["quiz", "is_virtual", "rank"], name="result_rank_idx"),
+        ]
        
 
     # def __str__(self):
     #     return f"{self.user} @ {self.quiz} rank={self.rank} Δ={self.rating_change or 0:+}"
 
-    
+
+class LeaderboardChange(models.Model):
+    """
+    Log of committed result changes of a quiz, numbered 1, 2, 3... per quiz
+    (contest.leaderboard). user is None when the results changed wholesale.
+    """
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="+")
+    version = models.PositiveBigIntegerField()
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            # the version counter: two writers can't both take the same number
+            models.UniqueConstraint(fields=["quiz", "version"], name="uniq_leaderboard_change_version"),
+        ]
+
+    def __str__(self):
+        return f"{self.quiz_id} v{self.version}: {self.user_id or 'all'}"
+
+
+class PendingSubmission(models.Model):
+    """
+    Answer batch accepted by the submit endpoint in write-behind mode
+    (settings.SUBMISSION_WRITE_BEHIND), waiting for `manage.py drain_submissions`.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    answers = models.JSONField()          # validated SubmissionItemSerializer data
+    enqueued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)    # failed ingests so far
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)   # set once parked: drain_batch skips the row
+
+    def __str__(self):
+        return f"{self.user} @ {self.quiz} ({len(self.answers)} answers)"
+
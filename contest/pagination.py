@@ -0,0 +1,165 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .standings import standings_after
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest first over (created_at, id), which is unique, so the cursor is just
+    the last row's key and the next page is
+
+        WHERE created_at <= c AND (created_at < c OR id < i) ORDER BY created_at DESC, id DESC
+
+    - a range scan on a (created_at, id) index however deep the page, unlike
+    OFFSET, and stable while rows are inserted. Forward-only: the response has
+    "next", not "previous". Works on model querysets and on .values() projections.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_at, pk = cursor
+            queryset = queryset.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(id__lt=pk))
+
+        rows = list(queryset[:self.page_size + 1])   # one extra row tells whether there is a next page
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = json.loads(b64decode(encoded.encode("ascii")))
+            created_at = datetime.fromisoformat(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def encode_cursor(self, row):
+        created_at, pk = (row["created_at"], row["id"]) if isinstance(row, dict) else (row.created_at, row.pk)
+        return b64encode(json.dumps([created_at.isoformat(), pk]).encode()).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class StandingCursorPagination(KeysetPagination):
+    """
+    Walks standings by materialized rank, then the rows not ranked yet
+    (standings.standings_after); the cursor is the last row's (rank, id) and
+    each page is a range scan on the (quiz, is_virtual, rank) index.
+    """
+
+    page_size = 50
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        rows = standings_after(queryset, self.page_size + 1, after=self.decode_cursor(request))
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            rank, pk = json.loads(b64decode(encoded.encode("ascii")))
+            return (None if rank is None else int(rank)), int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        return b64encode(json.dumps([row.rank, row.pk]).encode()).decode("ascii")
+
+
+class SearchResultsPagination(BasePagination):
+    """
+    Ranked search results (?q=), best matches first, paged by offset: the rank
+    order can't be resumed from a (created_at, id) key. OFFSET costs little
+    here - every page sorts all the matches by rank anyway, and it skips rows
+    of that sorted result, not of the table. Same response shape as
+    KeysetPagination; "next" carries ?offset=.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    offset_query_param = "offset"
+    invalid_offset_message = "Invalid offset"
+
+    get_page_size = KeysetPagination.get_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = int(request.query_params.get(self.offset_query_param, 0))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_offset_message)
+        if self.offset < 0:
+            raise NotFound(self.invalid_offset_message)
+
+        rows = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        return rows[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.page_size)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return KeysetPagination.get_paginated_response_schema(self, schema)
@@ -0,0 +1,95 @@
+"""
+Practice paper generator: fill a quiz with questions drawn at random to a
+set of quotas ("3 Easy SCQ from chapter 7, 2 Hard INT, ...").
+
+No ORDER BY RANDOM(): that scans and sorts every candidate row on each call.
+Each quota instead reads the ids of its candidates, an index-only scan of
+question_browse_idx (or the chapter FK index), and samples them in Python.
+The id lists are cached in the "quiz" alias under the question-bank version
+of contest.facets, so papers drawn to the same quotas between two bank edits
+cost no candidate queries at all. Questions of the embargoed next quiz and,
+optionally, of the last N quizzes are left out; both sets are loaded once
+per paper. The chosen rows
+are written through QuizUpdateSerializer._replace_quiz_questions, the same
+bulk path as a hand-built question list.
+"""
+import random
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Subquery
+
+from .embargo import embargoed_question_ids, invalidate_embargo
+from .facets import bank_version
+from .metrics import record_cache_lookup
+from .models import Question, Quiz, QuizQuestion
+from .question_cache import invalidate_quizzes
+from .serializers import QuizUpdateSerializer
+
+
+CACHE_ALIAS = "quiz"
+TIMEOUT = 3600
+QUOTA_FIELDS = ("chapter", "level", "type")
+
+
+def recently_used_ids(n, exclude_quiz=None):
+    """One query: ids of the questions in the n most recent quizzes (other than exclude_quiz)."""
+    if not n:
+        return frozenset()
+    recent = Quiz.objects.order_by("-created_at", "-id")
+    if exclude_quiz is not None:
+        recent = recent.exclude(pk=exclude_quiz.pk)
+    return frozenset(QuizQuestion.objects
+                     .filter(quiz_id__in=Subquery(recent.values("id")[:n]))
+                     .values_list("question_id", flat=True))
+
+
+def candidate_ids(subject, quota):
+    """Ids of the questions a quota may draw from, in index order; cached per bank version."""
+    filters = {field: quota[field] for field in QUOTA_FIELDS if quota.get(field) is not None}
+    cache = caches[CACHE_ALIAS]
+    key = f"papers:{bank_version()}:{subject}:" + ":".join(str(quota.get(field)) for field in QUOTA_FIELDS)
+    ids = cache.get(key)
+    record_cache_lookup("paper_candidates", ids is not None)
+    if ids is None:
+        ids = tuple(Question.objects.filter(subject=subject, **filters).order_by().values_list("id", flat=True))
+        cache.set(key, ids, timeout=TIMEOUT)
+    return ids
+
+
+def sample_paper(subject, quotas, exclude_recent=0, quiz=None, rng=random):
+    """
+    Question ids for a paper, quota by quota. quotas are dicts with a count
+    and optional chapter (id), level and type; a question picked for one quota
+    is not picked again for a later, overlapping one. Raises ValueError
+    naming the first quota that can't be filled.
+    """
+    excluded = set(embargoed_question_ids()) | recently_used_ids(exclude_recent, exclude_quiz=quiz)
+    if quiz is not None:
+        # regenerating the embargoed quiz itself may reuse its own questions
+        excluded -= set(QuizQuestion.objects.filter(quiz=quiz).values_list("question_id", flat=True))
+
+    chosen = []
+    for quota in quotas:
+        available = [qid for qid in candidate_ids(subject, quota) if qid not in excluded]
+        if len(available) < quota["count"]:
+            described = ", ".join(f"{field}={quota[field]}" for field in QUOTA_FIELDS if quota.get(field) is not None)
+            raise ValueError(f"Only {len(available)} unused {subject} questions for quota "
+                             f"({described or 'any'}), {quota['count']} wanted")
+        picked = rng.sample(available, quota["count"])
+        chosen += picked
+        excluded.update(picked)
+    return chosen
+
+
+@transaction.atomic
+def generate_paper(quiz, subject, quotas, exclude_recent=0, base_points=10, seed=None):
+    """Replace quiz's questions with a sampled paper; returns the QuizQuestion items written."""
+    ids = sample_paper(subject, quotas, exclude_recent, quiz=quiz, rng=random.Random(seed))
+    items = [{"question_id": qid, "order": order, "base_points": base_points}
+             for order, qid in enumerate(ids, start=1)]
+    QuizUpdateSerializer()._replace_quiz_questions(quiz, items)
+    # the serializer gets these from the Quiz post_save receiver; bulk_create sends no signals
+    transaction.on_commit(lambda: invalidate_quizzes([quiz.pk]))
+    transaction.on_commit(invalidate_embargo)
+    return items
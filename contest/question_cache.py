@@ -0,0 +1,136 @@
+"""
+Per-quiz cache of the ordered question payloads served by QuizViewSet.question.
+
+Questions of a running quiz don't change, so the whole quiz is built once
+(three queries), each question's JSON response is encoded to bytes with its
+ETag, and everything is kept in the "quiz" cache alias; see QUIZ_CACHE_BACKEND in
+settings for the local-memory / file / database / redis backends. Receivers in
+contest.signals drop the entry whenever the quiz, its QuizQuestion rows or one
+of its questions/options change. The quiz's scoring.AnswerKey is cached the
+same way for submission grading. Only a shared backend carries those drops to
+the other worker processes - otherwise a corrected answer key would keep
+grading with the old one there - so production settings require one.
+"""
+import hashlib
+import json
+
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from .metrics import record_cache_lookup
+from .models import Quiz, QuizQuestion, QuestionOption
+from .scoring import AnswerKey
+
+
+CACHE_ALIAS = "quiz"
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(quiz_id):
+    return f"quiz:{quiz_id}:questions"
+
+
+def _answer_key_key(quiz_id):
+    return f"quiz:{quiz_id}:answer_key"
+
+
+def build_quiz_payload(quiz_id):
+    """Quiz title plus its questions in order, as plain dicts. None if the quiz doesn't exist."""
+    quiz = Quiz.objects.filter(pk=quiz_id).values("id", "title").first()
+    if quiz is None:
+        return None
+
+    quiz_questions = (QuizQuestion.objects
+                      .filter(quiz_id=quiz_id)
+                      .select_related("question__chapter")
+                      .prefetch_related(Prefetch("question__options", queryset=QuestionOption.objects.order_by("id")))
+                      .order_by("order", "id"))
+
+    questions = []
+    for quiz_question in quiz_questions:
+        question = quiz_question.question
+        questions.append({
+            "id": question.id,
+            "text": question.statement,
+            "chapter": {
+                "id": question.chapter.id,
+                "name": question.chapter.title,
+            } if question.chapter else None,
+            # participant view: never ship is_correct
+            "options": [
+                {
+                    "id": opt.id,
+                    "text": opt.text,
+                }
+                for opt in question.options.all()
+            ],
+            "order": quiz_question.order,
+        })
+
+    payload = {"quiz_id": quiz["id"], "quiz_title": quiz["title"], "questions": questions}
+    payload["bodies"] = [encode(question_response(payload, n)) for n in range(1, len(questions) + 1)]
+    payload["etags"] = [_etag(body) for body in payload["bodies"]]
+    return payload
+
+
+def question_response(payload, question_number):
+    """Response body of QuizViewSet.question for a 1-indexed question number."""
+    total_questions = len(payload["questions"])
+    return {
+        "quiz_id": payload["quiz_id"],
+        "quiz_title": payload["quiz_title"],
+        "current_question": question_number,
+        "total_questions": total_questions,
+        "progress_percentage": round((question_number / total_questions) * 100, 1),
+        "has_next": question_number < total_questions,
+        "has_previous": question_number > 1,
+        "question": payload["questions"][question_number - 1],
+    }
+
+
+def encode(data):
+    """Compact UTF-8 JSON, the same bytes rest_framework's JSONRenderer would produce."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body):
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def get_quiz_payload(quiz_id):
+    """Cached build_quiz_payload(); a hit costs no queries."""
+    cache = _cache()
+    payload = cache.get(_key(quiz_id))
+    record_cache_lookup("quiz_payload", payload is not None)
+    if payload is None:
+        payload = build_quiz_payload(quiz_id)
+        if payload is not None:
+            cache.set(_key(quiz_id), payload)
+    return payload
+
+
+def get_answer_key(quiz_id):
+    """Cached scoring.AnswerKey of a quiz, invalidated together with its payload."""
+    cache = _cache()
+    key = cache.get(_answer_key_key(quiz_id))
+    record_cache_lookup("answer_key", key is not None)
+    if key is None:
+        key = AnswerKey.load(quiz_id)
+        cache.set(_answer_key_key(quiz_id), key)
+    return key
+
+
+def invalidate_quizzes(quiz_ids):
+    quiz_ids = set(quiz_ids)
+    if quiz_ids:
+        _cache().delete_many(
+            [_key(quiz_id) for quiz_id in quiz_ids] + [_answer_key_key(quiz_id) for quiz_id in quiz_ids]
+        )
+
+
+def invalidate_question(question_id):
+    """Drop every cached quiz that contains the question."""
+    invalidate_quizzes(QuizQuestion.objects.filter(question_id=question_id).values_list("quiz_id", flat=True))
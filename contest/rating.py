@@ -0,0 +1,126 @@
+"""
+Codeforces-style rating updates for rated quizzes.
+
+The expensive part of the classic algorithm is the expected seed
+    seed(R) = 1 + sum_j P(participant j beats rating R)
+evaluated for every participant and inside a binary search, which is O(n^2 log R).
+Ratings are integers, so seed(R) over the whole rating range is a correlation of
+the rating histogram with the Elo win-probability kernel: one FFT gives the full
+table, after which every seed and every binary search is an array lookup.
+"""
+import numpy as np
+from django.db import transaction
+
+from accounts.ratings import apply_rating_changes
+from .models import Quiz, UserQuizResult
+from .standings import STANDING_ORDER, finalize_standings, standing_results
+
+
+RATING_FLOOR = 1
+RATING_CEILING = 8000
+
+
+def win_probability(rating_a, rating_b):
+    """Elo probability that a participant rated rating_a beats one rated rating_b."""
+    return 1.0 / (1.0 + np.power(10.0, (np.asarray(rating_b) - np.asarray(rating_a)) / 400.0))
+
+
+def seed_table(ratings, low, high):
+    """
+    seed[R - low] = 1 + sum over all participants j of P(j beats R), for R in [low, high].
+    Computed as a histogram/kernel correlation with FFT in O((high - low) log(high - low)).
+    """
+    r_min = int(ratings.min())
+    counts = np.bincount(ratings - r_min)            # counts[v - r_min]
+    span = high - low + 1
+
+    # kernel over differences d = r_j - R, from (r_min - high) to (r_max - low)
+    d = np.arange(r_min - high, r_min + len(counts) - low)
+    kernel = win_probability(d, 0)
+
+    # convolving with the reversed kernel puts seed(R) at index len(counts) - 1 + (R - low)
+    size = 1 << int(np.ceil(np.log2(len(counts) + len(kernel))))
+    full = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel[::-1], size), size)
+    start = len(counts) - 1
+    return 1.0 + full[start:start + span]
+
+
+def tie_places(scores, penalties):
+    """
+    Actual place of each participant (input already in standings order); tied
+    participants all get the last place of their group, as Codeforces does.
+    """
+    n = len(scores)
+    places = np.arange(1, n + 1)
+    if n == 0:
+        return places
+    keys = np.column_stack([scores, penalties])
+    group_end = np.ones(n, dtype=bool)
+    group_end[:-1] = np.any(keys[1:] != keys[:-1], axis=1)
+    # each position takes the place of the next group end at or after it
+    end_positions = np.flatnonzero(group_end)
+    return places[end_positions[np.searchsorted(end_positions, np.arange(n))]]
+
+
+def compute_rating_changes(ratings, places):
+    """
+    New-rating deltas for one contest.
+    ratings: current ratings in standings order; places: from tie_places().
+    """
+    ratings = np.asarray(ratings, dtype=np.int64)
+    places = np.asarray(places, dtype=np.float64)
+    n = len(ratings)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    low = min(RATING_FLOOR, int(ratings.min()) - 1)
+    high = max(RATING_CEILING, int(ratings.max()) + 1)
+    seeds = seed_table(ratings, low, high)
+
+    # expected place of each participant against everyone else (drop P(self beats self) = 0.5)
+    own_seed = seeds[ratings - low] - 0.5
+    mid_rank = np.sqrt(places * own_seed)
+
+    # largest R with seed(R) >= mid_rank; seeds decrease as R grows
+    idx = np.searchsorted(-seeds, -mid_rank, side="right") - 1
+    need_rating = low + np.clip(idx, 0, len(seeds) - 1)
+    deltas = np.trunc((need_rating - ratings) / 2).astype(np.int64)
+
+    # keep the total roughly zero-sum, slightly deflationary
+    deltas += int(-deltas.sum() / n) - 1
+
+    # and the top-rated participants' changes sum to ~zero
+    top = min(4 * int(round(np.sqrt(n))), n)
+    by_rating = np.argsort(-ratings, kind="stable")[:top]
+    deltas += min(max(int(-deltas[by_rating].sum() / top), -10), 0)
+    return deltas
+
+
+@transaction.atomic
+def finalize_quiz(quiz_id):
+    """
+    Rank a quiz, and for rated quizzes apply rating changes to every pending
+    participant: results with bulk_update, users and profiles set-wise
+    through accounts.ratings.apply_rating_changes.
+    Returns the number of results finalized (0 if already finalized).
+    """
+    quiz = Quiz.objects.select_for_update().get(pk=quiz_id)
+
+    pending = list(standing_results(quiz_id)
+                   .filter(status=UserQuizResult.Status.PENDING)
+                   .select_related("user")
+                   .order_by(*STANDING_ORDER))
+    if not quiz.is_rated or not pending:
+        return finalize_standings(quiz_id)
+
+    ratings = np.array([r.user.rating for r in pending], dtype=np.int64)
+    places = tie_places(np.array([r.score for r in pending]), np.array([r.penalties for r in pending]))
+    deltas = compute_rating_changes(ratings, places)
+
+    for result, old, delta in zip(pending, ratings.tolist(), deltas.tolist()):
+        result.old_rating, result.rating_change, result.new_rating = old, delta, old + delta
+
+    UserQuizResult.objects.bulk_update(pending, ["old_rating", "new_rating", "rating_change"], batch_size=1000)
+    apply_rating_changes({r.user_id: r.rating_change for r in pending})
+
+    return finalize_standings(quiz_id)
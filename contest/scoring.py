@@ -0,0 +1,172 @@
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+
+from .models import Question, QuestionOption, QuizQuestion, Submission
+
+
+POINTS_PRECISION = Decimal("0.01")   # matches Submission.points_rewarded (decimal_places=2)
+
+
+class AnswerKey:
+    """
+    Answer key of one quiz, loaded once and kept in plain dicts keyed by
+    QuizQuestion id so grading a submission never touches the database.
+    """
+
+    def __init__(self, quiz_id, types, base_points, correct_options, integer_answers,
+                 options=None, quiz_questions=None, is_visible=True):
+        self.quiz_id = quiz_id
+        self.is_visible = is_visible            # Quiz.is_visible (hidden quizzes take no submissions)
+        self.types = types                      # qq_id -> 'SCQ' / 'MCQ' / 'INT'
+        self.base_points = base_points          # qq_id -> Decimal
+        self.correct_options = correct_options  # qq_id -> frozenset of option ids
+        self.integer_answers = integer_answers  # qq_id -> int or None
+        self.options = options or {}            # qq_id -> frozenset of all option ids
+        self.quiz_questions = quiz_questions or {}  # question_id -> qq_id
+
+    @classmethod
+    def load(cls, quiz_id, quiz_question_ids=None):
+        """
+        Two queries: the quiz's QuizQuestion rows and their options.
+        Pass quiz_question_ids to load only part of the key.
+        """
+        rows = QuizQuestion.objects.filter(quiz_id=quiz_id)
+        if quiz_question_ids is not None:
+            rows = rows.filter(id__in=quiz_question_ids)
+        rows = list(rows.values_list(
+            "id", "question_id", "base_points", "question__type", "question__correct_answer", "quiz__is_visible"
+        ))
+
+        types, base_points, integer_answers = {}, {}, {}
+        qq_ids_by_question = defaultdict(list)
+        is_visible = True
+        for qq_id, question_id, points, q_type, correct_answer, is_visible in rows:
+            types[qq_id] = q_type
+            base_points[qq_id] = Decimal(points)
+            integer_answers[qq_id] = _parse_int(correct_answer) if q_type == Question.TYPE_INTEGER else None
+            qq_ids_by_question[question_id].append(qq_id)
+
+        correct, options = defaultdict(set), defaultdict(set)
+        if qq_ids_by_question:
+            rows = (QuestionOption.objects
+                    .filter(question_id__in=list(qq_ids_by_question))
+                    .values_list("question_id", "id", "is_correct"))
+            for question_id, option_id, is_correct in rows:
+                for qq_id in qq_ids_by_question[question_id]:
+                    options[qq_id].add(option_id)
+                    if is_correct:
+                        correct[qq_id].add(option_id)
+
+        return cls(
+            quiz_id, types, base_points,
+            correct_options={qq_id: frozenset(correct.get(qq_id, ())) for qq_id in types},
+            integer_answers=integer_answers,
+            options={qq_id: frozenset(options.get(qq_id, ())) for qq_id in types},
+            quiz_questions={question_id: qq_ids[0] for question_id, qq_ids in qq_ids_by_question.items()},
+            is_visible=is_visible,
+        )
+
+    def __contains__(self, quiz_question_id):
+        return quiz_question_id in self.types
+
+    def grade(self, quiz_question_id, selected_option_ids=(), submitted_value=None) -> Decimal:
+        """
+        Points earned for one answer. Unknown questions score 0.
+        SCQ: full points if a correct option is among the picks. MCQ: partial
+        credit per correct option picked. With settings.STRICT_GRADING an SCQ
+        needs exactly the correct option and any wrong MCQ pick scores 0.
+        """
+        q_type = self.types.get(quiz_question_id)
+        if q_type is None:
+            return Decimal(0)
+        base = self.base_points[quiz_question_id]
+
+        selected = frozenset(selected_option_ids)
+        strict = getattr(settings, "STRICT_GRADING", False)
+
+        if q_type == Question.TYPE_SINGLE:
+            correct = self.correct_options[quiz_question_id]
+            if strict:
+                right = len(selected) == 1 and selected <= correct
+            else:
+                right = not correct.isdisjoint(selected)
+            return base if right else Decimal(0)
+
+        if q_type == Question.TYPE_MULTI:
+            correct = self.correct_options[quiz_question_id]
+            if not correct or (strict and not selected <= correct):
+                return Decimal(0)
+            hits = len(correct & selected)
+            return (base * hits / len(correct)).quantize(POINTS_PRECISION, rounding=ROUND_HALF_UP)
+
+        if q_type == Question.TYPE_INTEGER:
+            expected = self.integer_answers[quiz_question_id]
+            if expected is not None and expected == _parse_int(submitted_value):
+                return base
+            return Decimal(0)
+
+        return Decimal(0)
+
+
+def _parse_int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def selected_options_by_submission(quiz_id, submission_ids=None):
+    """submission_id -> set of selected option ids, in a single query on the M2M table."""
+    through = Submission.selected_options.through
+    rows = through.objects.filter(submission__quiz_id=quiz_id)
+    if submission_ids is not None:
+        rows = rows.filter(submission_id__in=submission_ids)
+
+    selected = defaultdict(set)
+    for submission_id, option_id in rows.values_list("submission_id", "questionoption_id"):
+        selected[submission_id].add(option_id)
+    return selected
+
+
+def grade_submissions(submissions, key, selected):
+    """
+    Grade submissions in memory against an AnswerKey, setting points_rewarded.
+    Returns the submissions whose points changed.
+    """
+    changed = []
+    for submission in submissions:
+        points = key.grade(
+            submission.question_id,
+            selected.get(submission.id, ()),
+            submission.submitted_value,
+        )
+        if submission.points_rewarded is None or Decimal(submission.points_rewarded) != points:
+            submission.points_rewarded = points
+            changed.append(submission)
+    return changed
+
+
+def rescore_quiz(quiz_id, user_ids=None, batch_size=1000):
+    """
+    Regrade every submission of a quiz in one pass:
+    answer key (2 queries) + submissions (1) + selected options (1) + bulk_update.
+    Returns the number of submissions whose points changed.
+    """
+    key = AnswerKey.load(quiz_id)
+
+    submissions = Submission.objects.filter(quiz_id=quiz_id)
+    if user_ids is not None:
+        submissions = submissions.filter(user_id__in=user_ids)
+    submissions = list(submissions.only("id", "question_id", "submitted_value", "points_rewarded"))
+    if not submissions:
+        return 0
+
+    selected = selected_options_by_submission(
+        quiz_id, None if user_ids is None else [s.id for s in submissions]
+    )
+    changed = grade_submissions(submissions, key, selected)
+    if changed:
+        Submission.objects.bulk_update(changed, ["points_rewarded"], batch_size=batch_size)
+    return len(changed)
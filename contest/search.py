@@ -0,0 +1,106 @@
+"""
+Full-text search over question titles and statements.
+
+SQLite: an FTS5 table (contest_question_search) indexes contest_question and is
+kept in sync by triggers. PostgreSQL: a GIN index on the tsvector expression
+PG_DOCUMENT. Both come from migration 0011. Anywhere else, or on an SQLite
+built without FTS5, search falls back to LIKE.
+
+Input is reduced to word tokens, all of which must match; the last one
+matches as a prefix, so results follow a setter typing in the search box.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = "contest_question_search"
+# the GIN index expression; columns are qualified here so joins (chapter.title) can't make them ambiguous
+PG_DOCUMENT = "to_tsvector('english', coalesce({table}.title, '') || ' ' || coalesce({table}.statement, ''))"
+
+_fts_tables = {}
+
+
+def tokens(text):
+    return re.findall(r"\w+", text or "")
+
+
+def _sqlite_match(words):
+    # every token quoted, so words like AND / NEAR / NOT are searched, not parsed
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _pg_tsquery(words):
+    return " & ".join(words[:-1] + [words[-1] + ":*"])
+
+
+def _table(queryset):
+    return connection.ops.quote_name(queryset.model._meta.db_table)
+
+
+def backend():
+    """"fts5", "postgresql" or "like"."""
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if connection.vendor == "sqlite":
+        name = connection.settings_dict["NAME"]
+        if name not in _fts_tables:
+            _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+        if _fts_tables[name]:
+            return "fts5"
+    return "like"
+
+
+def filter_matching(queryset, text):
+    """Questions matching every token of text, in the queryset's own order."""
+    words = tokens(text)
+    if not words:
+        return queryset
+    kind = backend()
+    if kind == "fts5":
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_sqlite_match(words)]
+        ))
+    if kind == "postgresql":
+        document = PG_DOCUMENT.format(table=_table(queryset))
+        return queryset.filter(RawSQL(f"{document} @@ to_tsquery('english', %s)", [_pg_tsquery(words)],
+                                      output_field=BooleanField()))
+
+    condition = Q()
+    for word in words:
+        condition &= Q(title__icontains=word) | Q(statement__icontains=word)
+    return queryset.filter(condition)
+
+
+def rank_matching(queryset, text):
+    """
+    filter_matching() plus a search_rank annotation (higher is better), best
+    matches first; ties, and every row of the LIKE fallback, newest first.
+    """
+    words = tokens(text)
+    if not words:
+        return queryset
+    kind = backend()
+    if kind == "fts5":
+        # bm25() only works in the query that runs the MATCH, so join the FTS
+        # table (models.QuestionSearch) rather than scoring each row with a
+        # correlated subquery (which re-runs the MATCH per row: seconds instead
+        # of milliseconds on short prefixes).
+        # bm25() is lower-is-better; title hits weigh double.
+        match = RawSQL(f"{FTS_TABLE} MATCH %s", [_sqlite_match(words)], output_field=BooleanField())
+        rank = RawSQL(f"-bm25({FTS_TABLE}, 2.0, 1.0)", [], output_field=FloatField())
+        return (queryset.filter(search_entry__isnull=False).filter(match)
+                .annotate(search_rank=rank)
+                .order_by("-search_rank", "-created_at", "-id"))
+
+    queryset = filter_matching(queryset, text)
+    if kind == "postgresql":
+        rank = RawSQL(f"ts_rank({PG_DOCUMENT.format(table=_table(queryset))}, to_tsquery('english', %s))",
+                      [_pg_tsquery(words)], output_field=FloatField())
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.annotate(search_rank=rank).order_by("-search_rank", "-created_at", "-id")
@@ -28,6 +28,43 @@ class QuestionSerializer(serializers.ModelSerializer):
 
         fields = ['title','chapter','statement','options','type']
 
+class QuestionListSerializer(serializers.Serializer):
+    """
+    Question bank list rows, read from a .values() projection (PROJECTION)
+    instead of model instances; with_options() adds the options of a whole page
+    with one query. Same fields as QuestionSerializer plus id, level and subject.
+    """
+
+    PROJECTION = ("id", "title", "level", "subject", "statement", "type", "created_at",
+                  "chapter__title", "chapter__subject")
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    level = serializers.CharField()
+    subject = serializers.CharField()
+    chapter = serializers.SerializerMethodField()
+    statement = serializers.CharField()
+    options = OptionSerializer(many=True)
+    type = serializers.CharField()
+
+    @classmethod
+    def with_options(cls, rows):
+        rows = list(rows)
+        options = {row["id"]: [] for row in rows}
+        for option in (QuestionOption.objects
+                       .filter(question_id__in=list(options))
+                       .order_by("id")
+                       .values("question_id", "id", "text")):
+            options[option.pop("question_id")].append(option)
+        for row in rows:
+            row["options"] = options[row["id"]]
+        return rows
+
+    def get_chapter(self, row):
+        if row["chapter__title"] is None:
+            return None
+        return {"title": row["chapter__title"], "subject": row["chapter__subject"]}
+
 class QuizQuestionSerializer(serializers.ModelSerializer):
 
     question = QuestionSerializer()
@@ -144,6 +181,21 @@ class QuizUpdateSerializer(serializers.ModelSerializer):
 
         return quiz
 
+class PaperQuotaSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1)
+    chapter = serializers.IntegerField(required=False)
+    level = serializers.ChoiceField(choices=Question.LEVEL_CHOICES, required=False)
+    type = serializers.ChoiceField(choices=Question.TYPE_CHOICES, required=False)
+
+
+class PaperSpecSerializer(serializers.Serializer):
+    """Constraints for papers.generate_paper."""
+    subject = serializers.ChoiceField(choices=Question.SUBJECT_CHOICE)
+    quotas = PaperQuotaSerializer(many=True, allow_empty=False)
+    exclude_recent = serializers.IntegerField(min_value=0, default=0)   # skip questions of the last N quizzes
+    base_points = serializers.IntegerField(min_value=0, default=10)
+    seed = serializers.IntegerField(required=False)
+
 class StandingSerializer(serializers.ModelSerializer):
 
     username = serializers.CharField(source="user.username", read_only=True)
@@ -153,3 +205,39 @@ class StandingSerializer(serializers.ModelSerializer):
         model = UserQuizResult
         fields = ['user_id','username','score','correct_answers','penalties','rank','status']
 
+
+class SubmissionItemSerializer(serializers.Serializer):
+    """
+    One answer. Checked against the quiz's AnswerKey passed in
+    context["answer_key"], so validation costs no queries.
+    """
+
+    question = serializers.IntegerField()          # Question id, as in the question payload
+    selected_options = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    submitted_value = serializers.CharField(max_length=155, required=False, allow_null=True, allow_blank=True)
+    time_taken = serializers.FloatField(min_value=0, required=False, default=0)
+
+    def validate(self, attrs):
+        key = self.context["answer_key"]
+        qq_id = key.quiz_questions.get(attrs["question"])
+        if qq_id is None:
+            raise serializers.ValidationError({"question": f"Question {attrs['question']} is not part of this quiz"})
+
+        unknown = set(attrs["selected_options"]) - key.options[qq_id]
+        if unknown:
+            raise serializers.ValidationError({"selected_options": f"Options {sorted(unknown)} don't belong to this question"})
+        if key.types[qq_id] == Question.TYPE_SINGLE and len(set(attrs["selected_options"])) > 1:
+            raise serializers.ValidationError({"selected_options": "A single-correct question takes one option"})
+        return attrs
+
+
+class SubmissionBatchSerializer(serializers.Serializer):
+
+    answers = SubmissionItemSerializer(many=True, allow_empty=False)
+
+    def validate_answers(self, items):
+        questions = [it["question"] for it in items]
+        if len(questions) != len(set(questions)):
+            raise serializers.ValidationError("Each question can be answered only once per batch")
+        return items
+
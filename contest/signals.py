@@ -1,64 +1,65 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Submission, UserQuizResult, Question
-from django.conf import settings
+from .aggregation import apply_submission
+from .embargo import invalidate_embargo
+from .facets import invalidate_facets
+from .leaderboard import invalidate_leaderboard
+from .models import Chapter, Question, QuestionOption, Quiz, QuizQuestion, Submission, UserQuizResult
+from .question_cache import get_answer_key, invalidate_question, invalidate_quizzes
+from .standings import rerank_if_due
 
 @receiver(post_save, sender=Submission)
 def submission_check(sender, instance, created, **kwargs):
 
-            submission = instance
-            question = submission.question.question
-            
-            if question.type == 'SCQ':
-                correct_option = question.options.filter(is_correct = True).first()
-
-                if correct_option and submission.selected_options.filter(id= correct_option.id).exists():
-                    submission.points_rewarded = question.base_points
-                else:
-                    submission.points_rewarded = 0
-
-            elif question.type == 'MCQ':
-                correct_options = set(question.options.filter(is_correct = True).values_list('id', flat=True))
-                selected_options = set(submission.selected_options.values_list('id', flat=True))
-
-                correct_count = len(correct_options & selected_options)
-                total_correct = len(correct_options) 
-
-                if total_correct > 0:
-                    submission.points_rewarded = (correct_count / total_correct) * question.base_points
-                else:
-                    submission.points_rewarded = 0  # Or handle this case differently if needed
-                
-            elif question.type == 'INT':
-
-                correct_answer = question.correct_answer
-                if int(correct_answer) == int(submission.submitted_value):
-                    submission.points_rewarded = question.base_points
-                else:
-                    submission.points_rewarded = 0 
-
-            submission.save()
-            
-            user = submission.user
-            quiz = submission.quiz
-
-            result,_= UserQuizResult.objects.get_or_create(user = user, quiz = quiz)
-
-            submissions = Submission.objects.filter(user_id = user.id, quiz_id = quiz.id)
-
-            total_points = 0
-            penalties = 0
-            correct_answers = 0
-
-            for sub in submissions:
-                total_points = total_points + sub.points_rewarded
-                if sub.points_rewarded>0:
-                    correct_answers += 1
-                else:
-                    penalties += 1
-
-            result.score = total_points - penalties * settings.PENALTY_MULTIPLIER
-            result.correct_answers = correct_answers
-            result.penalties = penalties
-            result.save()
+    submission = instance
+    # what this submission already contributed to the result (nothing if it's new)
+    old_points = None if created else submission.points_rewarded
 
+    key = get_answer_key(submission.quiz_id)
+    selected = submission.selected_options.values_list('id', flat=True)
+    points = key.grade(submission.question_id, set(selected), submission.submitted_value)
+
+    # queryset update instead of save() so this receiver doesn't fire itself again
+    Submission.objects.filter(pk=submission.pk).update(points_rewarded=points)
+    submission.points_rewarded = points
+
+    apply_submission(submission, old_points)
+    rerank_if_due(submission.quiz_id)
+
+
+# Question payload, embargo and facet cache invalidation. Done on commit so a reader
+# can't re-cache the old rows while the writing transaction is still open.
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_quizzes([instance.pk]))
+    transaction.on_commit(invalidate_embargo)   # is_visible may have changed
+
+
+@receiver([post_save, post_delete], sender=QuizQuestion)
+def quiz_question_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_quizzes([instance.quiz_id]))
+    transaction.on_commit(invalidate_embargo)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_question(instance.pk))
+    transaction.on_commit(invalidate_facets)
+
+
+@receiver([post_save, post_delete], sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_facets)   # chapter titles are part of the facets
+
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def question_option_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_question(instance.question_id))
+
+
+@receiver([post_save, post_delete], sender=UserQuizResult)
+def result_changed(sender, instance, **kwargs):
+    # admin edits, disqualifications; the live deltas are raw SQL and tracked by apply_result_delta
+    transaction.on_commit(lambda: invalidate_leaderboard(instance.quiz_id))
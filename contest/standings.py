@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .aggregation import reconcile_results
+from .leaderboard import invalidate_leaderboard
+from .models import UserQuizResult
+from .scoring import rescore_quiz
+
+
+# Standings order; rows tied on (score, penalties) share a rank unless the
+# rank method is "ordinal", which breaks ties by join time and id.
+STANDING_ORDER = ("-score", "penalties", "created_at", "id")
+
+RANK_FUNCTIONS = {
+    "competition": "RANK",        # 1, 2, 2, 4
+    "dense": "DENSE_RANK",        # 1, 2, 2, 3
+    "ordinal": "ROW_NUMBER",      # 1, 2, 3, 4
+}
+
+
+# Statuses that appear in standings. Filtered with IN rather than
+# is_virtual=False / exclude(status=DQ): Django renders those as NOT ...,
+# which SQLite can't use as index keys.
+LISTED_STATUSES = [UserQuizResult.Status.PENDING, UserQuizResult.Status.FINALIZED]
+
+
+def standing_results(quiz_id):
+    """Live, non-disqualified results of a quiz - the rows that appear in standings."""
+    return UserQuizResult.objects.filter(quiz_id=quiz_id, is_virtual__in=[False], status__in=LISTED_STATUSES)
+
+
+def rank_method(method=None):
+    method = method or getattr(settings, "STANDINGS_RANK_METHOD", "competition")
+    if method not in RANK_FUNCTIONS:
+        raise ValueError(f"Unknown rank method {method!r}, expected one of {sorted(RANK_FUNCTIONS)}")
+    return method
+
+
+def _supports_update_from():
+    if connection.vendor == "postgresql":
+        return True
+    # window functions arrived in SQLite 3.25, UPDATE ... FROM in 3.33
+    return connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 33, 0)
+
+
+def _assign_ranks_sql(quiz_id, method):
+    """One UPDATE ... FROM (window function) statement for the whole quiz."""
+    qn = connection.ops.quote_name
+    table = qn(UserQuizResult._meta.db_table)
+    rank, r_id = qn("rank"), qn("id")
+    distinct = "IS DISTINCT FROM" if connection.vendor == "postgresql" else "IS NOT"
+
+    order = "score DESC, penalties ASC"
+    if method == "ordinal":
+        order += ", created_at ASC, id ASC"
+
+    sql = f"""
+        UPDATE {table} SET {rank} = ranked.pos
+        FROM (
+            SELECT {r_id} AS rid, {RANK_FUNCTIONS[method]}() OVER (ORDER BY {order}) AS pos
+            FROM {table}
+            WHERE quiz_id = %s AND is_virtual = %s AND status <> %s
+        ) AS ranked
+        WHERE {table}.{r_id} = ranked.rid AND {table}.{rank} {distinct} ranked.pos
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [quiz_id, False, UserQuizResult.Status.DISQUALIFIED])
+        return cursor.rowcount
+
+
+def _assign_ranks_python(quiz_id, method):
+    """Fallback for old SQLite: one ordered read, ranks computed in Python, bulk_update."""
+    results = list(standing_results(quiz_id).order_by(*STANDING_ORDER).only("id", "score", "penalties", "rank"))
+
+    changed = []
+    previous, rank = None, 0
+    for position, result in enumerate(results, start=1):
+        tie_key = (result.score, result.penalties)
+        if method == "ordinal":
+            rank = position
+        elif tie_key != previous:
+            rank = position if method == "competition" else rank + 1
+        previous = tie_key
+        if result.rank != rank:
+            result.rank = rank
+            changed.append(result)
+
+    UserQuizResult.objects.bulk_update(changed, ["rank"], batch_size=1000)
+    return len(changed)
+
+
+def assign_ranks(quiz_id, method=None):
+    """
+    Materialize UserQuizResult.rank for a whole quiz.
+    method: "competition" (default, STANDINGS_RANK_METHOD), "dense" or "ordinal".
+    Returns the number of rows whose rank changed.
+    """
+    method = rank_method(method)
+    with transaction.atomic():
+        if _supports_update_from():
+            changed = _assign_ranks_sql(quiz_id, method)
+        else:
+            changed = _assign_ranks_python(quiz_id, method)
+
+        (UserQuizResult.objects
+            .filter(quiz_id=quiz_id, status=UserQuizResult.Status.DISQUALIFIED, rank__isnull=False)
+            .update(rank=None))
+    return changed
+
+
+def _rerank_keys(quiz_id):
+    return f"standings:rerank:{quiz_id}", f"standings:rerank:{quiz_id}:dirty"
+
+
+def rerank_if_due(quiz_id):
+    """
+    Live-contest throttle: re-rank at most once per STANDINGS_LIVE_RERANK_SECONDS
+    per quiz. The first submit after a quiet window ranks at once; submits
+    inside the window only mark the quiz dirty, and rerank_pending() - run by
+    the next submit or standings read after the window - ranks them.
+    Returns True if it ranked.
+    """
+    interval = getattr(settings, "STANDINGS_LIVE_RERANK_SECONDS", 0)
+    if not interval:
+        return False
+    window, dirty = _rerank_keys(quiz_id)
+    if not cache.add(window, 1, timeout=interval):
+        cache.set(dirty, 1, timeout=None)
+        return False
+    cache.delete(dirty)
+    assign_ranks(quiz_id)
+    return True
+
+
+def rerank_pending(quiz_id):
+    """
+    Trailing edge of the rerank_if_due() throttle: rank a quiz whose last
+    submits landed inside a closed window. A cache lookup when nothing is pending.
+    """
+    interval = getattr(settings, "STANDINGS_LIVE_RERANK_SECONDS", 0)
+    window, dirty = _rerank_keys(quiz_id)
+    if not interval or cache.get(dirty) is None:
+        return False
+    if not cache.add(window, 1, timeout=interval):
+        return False
+    cache.delete(dirty)
+    assign_ranks(quiz_id)
+    return True
+
+
+# Listing. Results created since the last re-rank have rank NULL; they are
+# listed after the ranked rows, by id, rather than hidden. Two range scans of
+# the (quiz, is_virtual, rank) index instead of ORDER BY rank NULLS LAST, which
+# no index can serve (NULLs sort first in it) and would sort the whole quiz;
+# the unranked scan only runs once the ranked rows run out.
+
+def standings_after(queryset, limit, after=None):
+    """
+    Up to limit rows of queryset in standings order, starting after the
+    (rank, id) key `after` (rank None for an unranked row), or from the top.
+    """
+    rank, pk = after if after is not None else (None, None)
+    rows = []
+    if after is None or rank is not None:
+        ranked = queryset.filter(rank__isnull=False).order_by("rank", "id")
+        if after is not None:
+            ranked = ranked.filter(Q(rank__gt=rank) | Q(rank=rank, id__gt=pk))
+        rows = list(ranked[:limit])
+    if len(rows) < limit:
+        unranked = queryset.filter(rank__isnull=True).order_by("id")
+        if after is not None and rank is None:
+            unranked = unranked.filter(id__gt=pk)
+        rows += unranked[:limit - len(rows)]
+    return rows
+
+
+@transaction.atomic
+def finalize_standings(quiz_id):
+    """Final ranking of a quiz; pending live results become FINALIZED."""
+    assign_ranks(quiz_id)
+    return (standing_results(quiz_id)
+            .filter(status=UserQuizResult.Status.PENDING)
+            .update(status=UserQuizResult.Status.FINALIZED, finalized_at=timezone.now()))
+
+
+@transaction.atomic
+def recompute_standings(quiz_id):
+    """
+    Full rebuild of a quiz's standings: regrade every submission, rewrite the
+    result totals that drifted, then rank. Run explicitly, never on a read.
+    Returns the number of ranked participants.
+    """
+    rescore_quiz(quiz_id)
+    reconcile_results(quiz_id, fix=True)
+    assign_ranks(quiz_id)
+    transaction.on_commit(lambda: invalidate_leaderboard(quiz_id))   # totals were rewritten wholesale
+    return standing_results(quiz_id).count()
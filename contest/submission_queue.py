@@ -0,0 +1,138 @@
+"""
+Write-behind submission queue.
+
+With settings.SUBMISSION_WRITE_BEHIND on, the submit endpoint only validates an
+answer batch and stores it as a PendingSubmission row, so a burst of submissions
+at quiz end costs one INSERT per request. `manage.py drain_submissions` workers
+then grade and apply the queued batches with the same ingest path the endpoint
+uses inline. Claiming, ingesting and deleting a batch happen in one transaction,
+so a crashed worker leaves its rows queued (at-least-once; re-applying a batch
+just replaces the same answers).
+
+Each (user, quiz) group of a batch is ingested under its own savepoint. A
+group that raises is rolled back alone, logged, and its rows stay queued
+with attempts + 1; after MAX_ATTEMPTS they are parked (failed_at set, kept
+for inspection and `drain_submissions --requeue-failed`) so one bad row
+can't stall the queue.
+
+Parallel workers need SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL). Without
+it (SQLite) two workers would claim the same rows, so run a single worker
+there; the command warns. With it, one user's rows can be claimed by two
+workers at once; a group with an older row claimed elsewhere is left queued
+for the next batch, so a user's answers are still applied in order.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .ingest import ingest_answers
+from .models import PendingSubmission
+from .question_cache import get_answer_key
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+def enqueue_answers(user_id, quiz_id, answers):
+    return PendingSubmission.objects.create(user_id=user_id, quiz_id=quiz_id, answers=answers)
+
+
+def _still_valid(answer, key):
+    """The quiz may have been edited since the batch was queued; drop answers that no longer fit."""
+    qq_id = key.quiz_questions.get(answer["question"])
+    return qq_id is not None and set(answer.get("selected_options") or ()) <= key.options[qq_id]
+
+
+def _claimed_elsewhere(rows):
+    """(user_id, quiz_id) pairs with a queued row older than this claim that another worker holds."""
+    return set(PendingSubmission.objects
+               .filter(failed_at__isnull=True, id__lt=rows[-1].id)
+               .exclude(id__in=[row.id for row in rows])
+               .values_list("user_id", "quiz_id")
+               .distinct())
+
+
+def _ingest_group(user_id, quiz_id, rows):
+    merged = {}
+    for row in rows:
+        for answer in row.answers:
+            merged[answer["question"]] = answer
+
+    key = get_answer_key(quiz_id)
+    answers = [a for a in merged.values() if _still_valid(a, key)]
+    if answers:
+        ingest_answers(user_id, quiz_id, answers, key)
+
+
+def _park(rows, error):
+    now = timezone.now()
+    for row in rows:
+        row.attempts += 1
+        row.last_error = error
+        if row.attempts >= MAX_ATTEMPTS:
+            row.failed_at = now
+    PendingSubmission.objects.bulk_update(rows, ["attempts", "last_error", "failed_at"])
+
+
+def drain_batch(batch_size=500):
+    """
+    Ingest up to batch_size queued rows, oldest first. Rows of the same
+    (user, quiz) are merged (later answers win) and ingested together, each
+    group under its own savepoint. Returns the number of queued rows
+    processed, failed ones included.
+    """
+    with transaction.atomic():
+        rows = PendingSubmission.objects.filter(failed_at__isnull=True).order_by("id")
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        if skip_locked:
+            rows = rows.select_for_update(skip_locked=True)   # lets several workers drain in parallel
+        rows = list(rows[:batch_size])
+        if not rows:
+            return 0
+
+        groups = defaultdict(list)
+        for row in rows:
+            groups[(row.user_id, row.quiz_id)].append(row)
+        if skip_locked:
+            # applying these now could overwrite newer answers with the other worker's older ones
+            for pair in _claimed_elsewhere(rows):
+                groups.pop(pair, None)
+
+        done, failed = [], 0
+        for (user_id, quiz_id), group in groups.items():
+            try:
+                with transaction.atomic():
+                    _ingest_group(user_id, quiz_id, group)
+            except Exception as exc:
+                logger.exception("drain: ingest failed for user %s quiz %s, queued rows %s",
+                                 user_id, quiz_id, [row.id for row in group])
+                _park(group, f"{type(exc).__name__}: {exc}")
+                failed += len(group)
+            else:
+                done += group
+
+        PendingSubmission.objects.filter(id__in=[row.id for row in done]).delete()
+        return len(done) + failed
+
+
+def requeue_failed():
+    """Put parked rows back in the queue with a fresh attempt count; returns how many."""
+    return PendingSubmission.objects.filter(failed_at__isnull=False).update(attempts=0, failed_at=None)
+
+
+def queue_stats():
+    """Queue depth and lag (age of the oldest queued batch, in seconds), and parked rows."""
+    queued = Q(failed_at__isnull=True)
+    stats = PendingSubmission.objects.aggregate(
+        depth=Count("id", filter=queued), oldest=Min("enqueued_at", filter=queued), failed=Count("id", filter=~queued))
+    oldest = stats["oldest"]
+    return {
+        "depth": stats["depth"],
+        "failed": stats["failed"],
+        "oldest_enqueued_at": oldest.isoformat() if oldest else None,
+        "lag_seconds": round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
@@ -1,3 +1,1301 @@
-from django.test import TestCase
+import asyncio
+import io
+import random
+import threading
+import unittest
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import benchmark
+from .aggregation import apply_result_delta, contribution, reconcile_results, submission_delta
+from .embargo import embargoed_question_ids, next_hidden_quiz
+from .ingest import ingest_answers
+from .management.commands.benchmark_contest import Command as BenchmarkCommand
+from .leaderboard import _log_change, get_leaderboard, invalidate_leaderboard, results_version
+from .live import StandingsPublisher, diff_standings, sse_event
+from .metrics import registry
+from .models import (Chapter, LeaderboardChange, Question, QuestionOption, Quiz, QuizQuestion, Submission,
+                     UserQuizResult)
+from .rating import compute_rating_changes, finalize_quiz, seed_table, tie_places, win_probability
+from .scoring import AnswerKey, rescore_quiz
+from .serializers import SubmissionItemSerializer
+from .standings import (STANDING_ORDER, _assign_ranks_python, _assign_ranks_sql, _supports_update_from, assign_ranks,
+                        rerank_if_due, standing_results)
+from .submission_queue import (MAX_ATTEMPTS, _claimed_elsewhere, drain_batch, enqueue_answers, queue_stats,
+                               requeue_failed)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite-specific")
+class HotPathIndexTests(TestCase):
+    """Each hot query must be an index SEARCH, never a SCAN of its table."""
+
+    def assertUsesIndex(self, queryset, table, index_name):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf"SEARCH {table} USING (COVERING )?INDEX {index_name}\b", plan)
+        self.assertNotRegex(plan, rf"SCAN {table}\b", plan)
+
+    def test_ordered_question_slice(self):
+        qs = QuizQuestion.objects.filter(quiz_id=1).order_by("order", "id")
+        self.assertUsesIndex(qs, "contest_quizquestion", "quizquestion_quiz_order_idx")
+        self.assertNotIn("TEMP B-TREE", qs.explain())
+
+    def test_standings_by_rank(self):
+        qs = standing_results(1).filter(rank__isnull=False).order_by("rank", "id")
+        self.assertUsesIndex(qs, "contest_userquizresult", "result_rank_idx")
+        self.assertNotIn("TEMP B-TREE", qs.explain())
+
+    def test_standings_by_score(self):
+        qs = standing_results(1).order_by(*STANDING_ORDER)
+        self.assertUsesIndex(qs, "contest_userquizresult", "result_(standings|rank)_idx")
+
+    def test_next_hidden_quiz(self):
+        self.assertUsesIndex(next_hidden_quiz(), "contest_quiz", "quiz_visible_id_idx")
+
+    def test_question_keyset_page(self):
+        qs = (Question.objects
+              .filter(created_at__lte=timezone.now())
+              .filter(Q(created_at__lt=timezone.now()) | Q(id__lt=100))
+              .order_by("-created_at", "-id")[:50])
+        self.assertUsesIndex(qs, "contest_question", "question_created_id_idx")
+        self.assertNotIn("TEMP B-TREE", qs.explain())
+
+    def test_question_bank_browsing(self):
+        qs = Question.objects.filter(subject="MATH", level="Easy", type=Question.TYPE_SINGLE, is_visible=True)
+        self.assertUsesIndex(qs, "contest_question", "question_browse_idx")
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint runs within a fixed number of queries on a realistically
+    sized contest (50 questions x 4 options, 1,000 participants). A budget
+    that has to grow with the fixtures means an N+1 crept in.
+    """
+
+    QUESTIONS = 50
+    OPTIONS = 4
+    PARTICIPANTS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.chapter = Chapter.objects.create(title="Algebra", subject="Maths")
+        cls.quiz = cls._make_quiz(is_visible=True, size=cls.QUESTIONS)
+        cls.hidden_quiz = cls._make_quiz(is_visible=False, size=10)   # the embargoed next quiz
+
+        cls.users = User.objects.bulk_create([User(username=f"user{i}") for i in range(cls.PARTICIPANTS)])
+        UserQuizResult.objects.bulk_create([
+            UserQuizResult(user=user, quiz=cls.quiz, score=i % 97, penalties=i % 5)
+            for i, user in enumerate(cls.users)
+        ])
+        assign_ranks(cls.quiz.id)
+
+        cls.question_ids = list(cls.quiz.quiz_question.order_by("order").values_list("question_id", flat=True))
+        cls.correct = dict(QuestionOption.objects
+                           .filter(question_id__in=cls.question_ids, is_correct=True)
+                           .values_list("question_id", "id"))
+
+    @classmethod
+    def _make_quiz(cls, is_visible, size):
+        quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=is_visible)
+        questions = Question.objects.bulk_create([
+            Question(title=f"Q{i}", level="Easy", subject="MATH", statement="...",
+                     type=Question.TYPE_SINGLE, chapter=cls.chapter, is_visible=True)
+            for i in range(size)
+        ])
+        QuestionOption.objects.bulk_create([
+            QuestionOption(question=question, text=str(j), is_correct=j == 0)
+            for question in questions for j in range(cls.OPTIONS)
+        ])
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=quiz, question=question, order=i)
+            for i, question in enumerate(questions, start=1)
+        ])
+        return quiz
+
+    def setUp(self):
+        for alias in ("default", "quiz"):
+            caches[alias].clear()
+        invalidate_leaderboard(self.quiz.id)   # a board left by another test may match this test's log
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        executed = "\n".join(query["sql"] for query in ctx.captured_queries)
+        self.assertLessEqual(len(ctx), budget, f"{len(ctx)} queries, budget {budget}:\n{executed}")
+
+    def get(self, url, budget, status=200, **headers):
+        with self.assertMaxQueries(budget):
+            response = self.client.get(url, HTTP_ACCEPT="application/json", **headers)
+        self.assertEqual(response.status_code, status, getattr(response, "content", b"")[:500])
+        return response
+
+    def test_chapter_list(self):
+        self.get("/contest/Chapters/", 1)
+
+    def test_quiz_list(self):
+        self.get("/contest/Quizzes/", 1)
+
+    def test_quiz_retrieve(self):
+        # quiz, its questions with chapters, their options
+        response = self.get(f"/contest/Quizzes/{self.quiz.id}/", 3)
+        self.assertEqual(len(response.json()["quiz_question"]), self.QUESTIONS)
+
+    def test_quiz_question(self):
+        url = f"/contest/Quizzes/{self.quiz.id}/question/{self.QUESTIONS}/"
+        cold = self.get(url, 3)
+        question = cold.json()["question"]
+        self.assertTrue(question["options"])
+        self.assertNotIn("is_correct", question)
+        for option in question["options"]:
+            self.assertNotIn("is_correct", option)   # the answer key never reaches the client
+        self.assertNotIn(b"is_correct", cold.content)
+        self.get(url, 0)    # served from the quiz cache
+        self.get(url, 0, status=304, HTTP_IF_NONE_MATCH=cold["ETag"])
+
+    def test_quiz_start(self):
+        self.get(f"/contest/Quizzes/{self.quiz.id}/start/", 2)
+
+    def test_question_list(self):
+        # questions with chapters, their options, + the embargo set when it isn't cached
+        response = self.get("/contest/Questions/", 3)
+        self.assertEqual(len(response.json()["results"]), self.QUESTIONS)   # the hidden quiz's questions are left out
+        self.get("/contest/Questions/", 2)
+
+    def test_question_pages(self):
+        """Every keyset page costs the same two queries; together they list each question once, newest first."""
+        embargoed_question_ids()   # warm, so every page is measured the same way
+        url, seen = "/contest/Questions/?page_size=15", []
+        while url:
+            body = self.get(url, 2).json()
+            seen += [row["id"] for row in body["results"]]
+            self.assertTrue(all(len(row["options"]) == self.OPTIONS for row in body["results"]))
+            url = body["next"]
+        self.assertEqual(seen, sorted(self.question_ids, reverse=True))   # bulk rows share created_at: id breaks ties
+
+    def test_quiz_pages(self):
+        first = self.get("/contest/Quizzes/?page_size=1", 1).json()
+        second = self.get(first["next"], 1).json()
+        self.assertEqual([first["results"][0]["id"], second["results"][0]["id"]],
+                         [self.hidden_quiz.id, self.quiz.id])
+        self.assertIsNone(second["next"])
+
+    def test_invalid_cursor(self):
+        self.get("/contest/Questions/?cursor=garbage", 3, status=404)
+
+    def test_question_retrieve(self):
+        self.get(f"/contest/Questions/{self.question_ids[0]}/", 3)
+        self.get(f"/contest/Questions/{self.question_ids[1]}/", 2)
+
+    def test_nested_quiz_questions(self):
+        response = self.get(f"/contest/Quizzes/{self.quiz.id}/questions/", 2)
+        self.assertEqual(len(response.json()), self.QUESTIONS)
+
+    def test_standings(self):
+        response = self.get(f"/contest/Quizzes/{self.quiz.id}/standings/?page_size=500", 1)
+        self.assertEqual(len(response.json()["results"]), 500)
+        # the last ranked page also checks for rows not ranked yet
+        self.get(f"/contest/Quizzes/{self.quiz.id}/standings/?cursor={response.json()['next'].split('cursor=')[1]}", 2)
+
+    def test_standings_top(self):
+        response = self.get(f"/contest/Quizzes/{self.quiz.id}/standings/top/?k=500", 1)
+        self.assertEqual(len(response.json()), 500)
+
+    def test_standings_around(self):
+        user = self.users[self.PARTICIPANTS // 2]
+        response = self.get(f"/contest/Quizzes/{self.quiz.id}/standings/around/?user={user.id}&n=100", 3)
+        self.assertEqual(len(response.json()["results"]), 201)
+
+    def test_submit(self):
+        self.client.force_login(self.users[0])
+        answers = [{"question": qid, "selected_options": [self.correct[qid]]} for qid in self.question_ids]
+        url = f"/contest/Quizzes/{self.quiz.id}/submit/"
+        # session + user, answer key, finalized check, savepoints, bulk writes, result delta, live re-rank
+        with self.assertMaxQueries(15):
+            response = self.client.post(url, {"answers": answers}, content_type="application/json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {"created": self.QUESTIONS, "updated": 0})
+
+        with self.assertMaxQueries(9):   # answer key cached, re-rank throttled; same cost for 50 updates
+            response = self.client.post(url, {"answers": answers}, content_type="application/json")
+        self.assertEqual(response.json(), {"created": 0, "updated": self.QUESTIONS})
+
+
+@override_settings(SECURE_SSL_REDIRECT=True, SESSION_COOKIE_SECURE=True, CSRF_COOKIE_SECURE=True)
+class BenchmarkTests(TransactionTestCase):
+    """A replay under the production HTTPS settings reaches the endpoints instead of their redirects."""
+
+    def assertAllSucceeded(self, base_url=None):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("the replay threads need a file-backed SQLite test database (TEST_DB_NAME)")
+        caches["quiz"].clear()
+        contest = benchmark.build_contest(participants=4, questions=3)
+        events = benchmark.build_timeline(contest, duration=1, poll_every=2)
+        samples, wall, exceptions = benchmark.replay(events, contest.quiz.id, benchmark.session_cookies(contest.users),
+                                                     workers=2, base_url=base_url)
+        self.assertEqual(len(samples), len(events))
+        self.assertEqual({status for _, status, *rest in samples if benchmark.is_error(status)}, set())
+        self.assertEqual(exceptions, {})
+        self.assertEqual(benchmark.summarize(samples, wall, exceptions)["total"]["errors"], 0)
+
+    def test_test_client(self):
+        self.assertAllSucceeded()
+
+    def test_wsgi_server(self):
+        server, base_url = benchmark.serve()
+        try:
+            self.assertAllSucceeded(base_url)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_failures_abort_the_report(self):
+        command = BenchmarkCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        report = {
+            "total": {"requests": 100, "errors": 40},
+            "endpoints": {"quiz-submit": {"statuses": {201: 60, 500: 40}}},
+            "exceptions": {"OperationalError: database is locked": 40},
+        }
+        with self.assertRaisesMessage(CommandError, '40 failed with "database is locked"'):
+            command._check_errors(report, max_error_rate=0.01)
+
+        report["total"]["errors"] = 1
+        command._check_errors(report, max_error_rate=0.05)   # a few: reported, loudly
+        self.assertIn("WARNING: 1 of 100 requests were not 2xx", command.stderr.getvalue())
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN="scrape")
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        question = Question.objects.create(title="Q", level="Easy", subject="MATH", statement="...",
+                                           type=Question.TYPE_SINGLE, is_visible=True)
+        QuestionOption.objects.create(question=question, text="a", is_correct=True)
+        QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=1)
+
+    def setUp(self):
+        registry.reset()
+        caches["quiz"].clear()
+
+    def scrape(self):
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_keyed_by_view_and_action(self):
+        for _ in range(2):
+            self.client.get(f"/contest/Quizzes/{self.quiz.id}/question/1/", HTTP_ACCEPT="application/json")
+        text = self.scrape()
+        labels = 'view="QuizViewSet.question",method="GET"'
+        self.assertIn(f'blitz_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'blitz_responses_total{{{labels},status="2xx"}} 2', text)
+        self.assertIn('blitz_db_sampled_requests_total{view="QuizViewSet.question"} 2', text)
+        self.assertIn('blitz_db_queries_total{view="QuizViewSet.question"} 3', text)   # cold build only
+        self.assertIn('blitz_cache_lookups_total{cache="quiz_payload",result="hit"} 1', text)
+        self.assertIn('blitz_cache_lookups_total{cache="quiz_payload",result="miss"} 1', text)
+
+    def test_scrape_needs_token_or_staff(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+
+
+class ConcurrentResultUpdateTests(TransactionTestCase):
+    """Parallel submissions must add up exactly: no lost updates, no duplicate live results."""
+
+    THREADS = 8
+
+    def setUp(self):
+        # checked here, not in a decorator: only now does the connection point at the test database
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("threads need a file-backed SQLite test database (TEST_DB_NAME)")
+        User = get_user_model()
+        self.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        self.users = User.objects.bulk_create([User(username=f"user{i}") for i in range(4)])
+
+    def run_threads(self, target, jobs):
+        errors = []
+
+        def work(chunk):
+            try:
+                for job in chunk:
+                    target(*job)
+            except Exception as exc:   # surfaced in the main thread
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(jobs[i::self.THREADS],)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_deltas_on_one_result(self):
+        user = self.users[0]
+        # the row doesn't exist yet: every thread races to insert it
+        self.run_threads(lambda: apply_result_delta(user.id, self.quiz.id, 2.5, 1, 1), [()] * 400)
+
+        result = UserQuizResult.objects.get(user=user, quiz=self.quiz, is_virtual=False)
+        self.assertEqual((result.score, result.correct_answers, result.penalties), (1000.0, 400, 400))
+
+    def test_virtual_results_are_left_alone(self):
+        user = self.users[0]
+        UserQuizResult.objects.create(user=user, quiz=self.quiz, is_virtual=True, score=7)
+        apply_result_delta(user.id, self.quiz.id, 3, 1, 0)
+        apply_result_delta(user.id, self.quiz.id, 3, 1, 0)
+        self.assertEqual(
+            sorted(UserQuizResult.objects.filter(user=user).values_list("is_virtual", "score")),
+            [(False, 6.0), (True, 7.0)],
+        )
+
+    def test_parallel_submissions_match_full_recompute(self):
+        questions = Question.objects.bulk_create([
+            Question(title=f"Q{i}", level="Easy", subject="MATH", statement="...",
+                     type=Question.TYPE_INTEGER, correct_answer=str(i), is_visible=True)
+            for i in range(25)
+        ])
+        quiz_questions = QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=self.quiz, question=question, order=i)
+            for i, question in enumerate(questions, start=1)
+        ])
+
+        rng = random.Random(0)
+        jobs = [
+            (user.id, qq.id, str(i if rng.random() < 0.6 else -1))
+            for user in self.users for i, qq in enumerate(quiz_questions)
+        ]
+        rng.shuffle(jobs)   # each user's answers are spread over all threads
+
+        def submit(user_id, qq_id, value):
+            Submission.objects.create(user_id=user_id, quiz=self.quiz, question_id=qq_id,
+                                      submitted_value=value, time_taken=1)
+
+        self.run_threads(submit, jobs)
+
+        self.assertEqual(Submission.objects.count(), len(jobs))
+        self.assertEqual(UserQuizResult.objects.filter(quiz=self.quiz).count(), len(self.users))
+        self.assertEqual(reconcile_results(self.quiz.id), [])
+
+    def test_parallel_ingest_batches(self):
+        questions = Question.objects.bulk_create([
+            Question(title=f"Q{i}", level="Easy", subject="MATH", statement="...",
+                     type=Question.TYPE_INTEGER, correct_answer=str(i), is_visible=True)
+            for i in range(10)
+        ])
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=self.quiz, question=question, order=i, base_points=10)
+            for i, question in enumerate(questions, start=1)
+        ])
+        key = AnswerKey.load(self.quiz.id)
+
+        # every user answers each question twice, right then wrong or the other way round,
+        # in small batches spread over all threads: inserts race inserts, updates race updates
+        rng = random.Random(0)
+        jobs = []
+        for user in self.users:
+            for i, question in enumerate(questions):
+                values = [str(i), "-1"]
+                rng.shuffle(values)
+                jobs += [(user.id, question.id, value) for value in values]
+        rng.shuffle(jobs)
+
+        def ingest(user_id, question_id, value):
+            ingest_answers(user_id, self.quiz.id, [{"question": question_id, "submitted_value": value}], key)
+
+        self.run_threads(ingest, jobs)
+
+        self.assertEqual(Submission.objects.count(), len(self.users) * len(questions))
+        results = UserQuizResult.objects.filter(quiz=self.quiz)
+        self.assertEqual(results.count(), len(self.users))
+        for result in results:
+            self.assertEqual(result.correct_answers + result.penalties, len(questions))
+        self.assertEqual(reconcile_results(self.quiz.id), [])
+
+
+class EmbargoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.question = Question.objects.create(title="Q", level="Easy", subject="MATH", statement="...",
+                                               type=Question.TYPE_SINGLE, is_visible=True)
+
+    def setUp(self):
+        caches["quiz"].clear()
+
+    def list_titles(self):
+        response = self.client.get("/contest/Questions/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return [q["title"] for q in response.json()["results"]]
+
+    def test_without_hidden_quiz_nothing_is_embargoed(self):
+        self.assertEqual(self.list_titles(), ["Q"])
+
+    def test_embargo_follows_quiz_visibility(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz = Quiz.objects.create(title="Next", subject="MATH", created_at=timezone.now(), is_visible=False)
+            QuizQuestion.objects.create(quiz=quiz, question=self.question, order=1)
+        self.assertEqual(embargoed_question_ids(), {self.question.id})
+        self.assertEqual(self.list_titles(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz.is_visible = True
+            quiz.save()
+        self.assertEqual(embargoed_question_ids(), frozenset())
+        self.assertEqual(self.list_titles(), ["Q"])
+
+
+class SearchTests(TestCase):
+    """?q= on the question list: FTS5 on SQLite, tsvector on PostgreSQL, LIKE elsewhere."""
+
+    @classmethod
+    def setUpTestData(cls):
+        def make(title, statement):
+            return Question.objects.create(title=title, level="Easy", subject="MATH", statement=statement,
+                                           type=Question.TYPE_SINGLE, is_visible=True)
+        cls.in_title = make("Definite integrals", "Evaluate the area under the curve.")
+        cls.in_statement = make("Areas", "Use a definite integral to find the area.")
+        cls.unrelated = make("Momentum", "A ball hits a wall elastically.")
+
+    def setUp(self):
+        caches["quiz"].clear()
+
+    def search(self, text, **params):
+        response = self.client.get("/contest/Questions/", {"q": text, **params}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return [q["title"] for q in response.json()["results"]]
+
+    def test_matches_every_word(self):
+        self.assertCountEqual(self.search("definite integral"), ["Definite integrals", "Areas"])
+        self.assertEqual(self.search("integral wall"), [])
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.search("moment"), ["Momentum"])
+
+    @unittest.skipIf(connection.vendor not in ("sqlite", "postgresql"), "no ranking on the LIKE fallback")
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search("integral"), ["Definite integrals", "Areas"])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.search("integral", level="Hard"), [])
+
+    def test_query_syntax_is_not_parsed(self):
+        self.assertEqual(self.search('AND NEAR "( *'), [])
+
+    def test_pages_through_every_match(self):
+        seen, url, params = [], "/contest/Questions/", {"q": "area", "page_size": 1}
+        while url:
+            data = self.client.get(url, params, HTTP_ACCEPT="application/json").json()
+            seen += [q["title"] for q in data["results"]]
+            url, params = data["next"], None
+        self.assertEqual(sorted(seen), ["Areas", "Definite integrals"])
+        self.assertEqual(self.client.get("/contest/Questions/", {"q": "area", "offset": "-1"},
+                                         HTTP_ACCEPT="application/json").status_code, 404)
+
+    def test_index_follows_edits(self):
+        self.unrelated.statement = "Sum the force over time."
+        self.unrelated.title = "Impulse"
+        self.unrelated.save()
+        self.assertEqual(self.search("momentum"), [])
+        self.assertEqual(self.search("impulse"), ["Impulse"])
+        self.in_title.delete()
+        self.assertEqual(self.search("integral"), ["Areas"])
+
+    def test_admin_search(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        response = self.client.get("/admin/contest/question/", {"q": "elastic"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["cl"].result_list), [self.unrelated])
+
+
+class FacetTests(TestCase):
+
+    URL = "/contest/Questions/facets/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.algebra = Chapter.objects.create(title="Algebra", subject="Maths")
+        cls.kinematics = Chapter.objects.create(title="Kinematics", subject="Physics")
+
+        def make(subject, level, type, chapter, title="Q"):
+            return Question.objects.create(title=title, level=level, subject=subject, statement="...",
+                                           type=type, chapter=chapter, is_visible=True)
+        make("MATH", "Easy", Question.TYPE_SINGLE, cls.algebra)
+        make("MATH", "Hard", Question.TYPE_INTEGER, cls.algebra, title="Quadratic integral")
+        make("PHYSICS", "Easy", Question.TYPE_SINGLE, cls.kinematics)
+        cls.hidden = make("PHYSICS", "Medium", Question.TYPE_MULTI, None)
+
+    def setUp(self):
+        caches["quiz"].clear()
+
+    def facets(self, budget, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.URL, params, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx), budget, "\n".join(query["sql"] for query in ctx.captured_queries))
+        data = response.json()
+        return data["total"], {facet: {row.get("value", row.get("title")): row["count"] for row in data[facet]}
+                               for facet in ("subject", "level", "type", "chapter")}
+
+    def test_all_facets_in_one_query(self):
+        total, facets = self.facets(budget=3)   # embargo lookup (2 cold) + the grouped count
+        self.assertEqual(total, 4)
+        self.assertEqual(facets["subject"], {"MATH": 2, "PHYSICS": 2})
+        self.assertEqual(facets["level"], {"Easy": 2, "Medium": 1, "Hard": 1})
+        self.assertEqual(facets["type"], {"SCQ": 2, "MCQ": 1, "INT": 1})
+        self.assertEqual(facets["chapter"], {"Algebra": 2, "Kinematics": 1, None: 1})
+
+    def test_cached_per_filter_combination(self):
+        self.facets(budget=3, subject="math")
+        total, facets = self.facets(budget=0, subject="MATH")
+        self.assertEqual(total, 2)
+        self.assertEqual(facets["level"], {"Easy": 1, "Medium": 0, "Hard": 1})
+
+        total, facets = self.facets(budget=2, subject="MATH", q="integral")   # + contest.search's one-off table check
+        self.assertEqual(total, 1)
+        self.assertEqual(facets["type"], {"SCQ": 0, "MCQ": 0, "INT": 1})
+
+    def test_question_changes_invalidate(self):
+        self.assertEqual(self.facets(budget=3)[0], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hidden.delete()
+        self.assertEqual(self.facets(budget=1)[0], 3)
+
+    def test_respects_embargo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz = Quiz.objects.create(title="Next", subject="PHYSICS", created_at=timezone.now(), is_visible=False)
+            QuizQuestion.objects.create(quiz=quiz, question=self.hidden, order=1)
+        total, facets = self.facets(budget=3)
+        self.assertEqual(total, 3)
+        self.assertEqual(facets["type"]["MCQ"], 0)
+
+        self.client.force_login(get_user_model().objects.create_user("setter", is_staff=True))
+        self.assertEqual(self.facets(budget=1 + 3)[0], 4)   # session + user, then the unembargoed count
+
+
+class PaperGeneratorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.algebra = Chapter.objects.create(title="Algebra", subject="Maths")
+        cls.calculus = Chapter.objects.create(title="Calculus", subject="Maths")
+        Question.objects.bulk_create([
+            Question(title=f"{chapter.title} {level} {type}", level=level, subject="MATH", statement="...",
+                     type=type, chapter=chapter, is_visible=True)
+            for chapter in (cls.algebra, cls.calculus)
+            for level in ("Easy", "Hard")
+            for type in (Question.TYPE_SINGLE, Question.TYPE_INTEGER)
+            for _ in range(3)
+        ])
+        cls.quiz = Quiz.objects.create(title="Practice", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.staff = get_user_model().objects.create_user("setter", is_staff=True)
+
+    def setUp(self):
+        caches["quiz"].clear()
+        self.client.force_login(self.staff)
+
+    def generate(self, quiz=None, status=201, **spec):
+        response = self.client.post(f"/contest/Quizzes/{(quiz or self.quiz).id}/generate/",
+                                    {"subject": "MATH", **spec}, content_type="application/json")
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def paper(self, quiz=None):
+        return list(Question.objects.filter(quizquestion__quiz=quiz or self.quiz).order_by("quizquestion__order"))
+
+    def test_fills_quotas(self):
+        self.generate(quotas=[
+            {"count": 2, "chapter": self.calculus.id, "level": "Hard", "type": "INT"},
+            {"count": 4, "level": "Easy"},
+        ], seed=1)
+        paper = self.paper()
+        self.assertEqual(len(paper), 6)
+        self.assertEqual(len(set(paper)), 6)
+        self.assertTrue(all(q.chapter_id == self.calculus.id and q.level == "Hard" and q.type == "INT"
+                            for q in paper[:2]))
+        self.assertTrue(all(q.level == "Easy" for q in paper[2:]))
+        self.assertEqual(list(self.quiz.quiz_question.values_list("order", flat=True)), [1, 2, 3, 4, 5, 6])
+
+    def test_seed_is_reproducible(self):
+        first = self.generate(quotas=[{"count": 5}], seed=7)["questions"]
+        self.assertEqual(self.generate(quotas=[{"count": 5}], seed=7)["questions"], first)
+
+    def test_excludes_recent_quizzes(self):
+        used = Quiz.objects.create(title="Last week", subject="MATH", created_at=timezone.now(), is_visible=True)
+        self.generate(quiz=used, quotas=[{"count": 3, "chapter": self.algebra.id, "level": "Easy", "type": "SCQ"}])
+
+        self.generate(quotas=[{"count": 1, "chapter": self.algebra.id, "level": "Easy", "type": "SCQ"}],
+                      exclude_recent=1, status=400)
+        self.generate(quotas=[{"count": 3, "chapter": self.algebra.id, "level": "Easy", "type": "SCQ"}])
+
+    def test_skips_embargoed_questions(self):
+        hidden = Quiz.objects.create(title="Next", subject="MATH", created_at=timezone.now(), is_visible=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate(quiz=hidden, quotas=[{"count": 12, "level": "Easy"}])
+        self.assertEqual(len(embargoed_question_ids()), 12)
+
+        self.generate(quotas=[{"count": 1, "level": "Easy"}], status=400)
+        self.generate(quiz=hidden, quotas=[{"count": 12, "level": "Easy"}])   # its own questions stay available
+
+    def test_query_count_is_per_quota_not_per_question(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.generate(quotas=[{"count": 12, "level": "Easy"}, {"count": 12, "level": "Hard"}])
+        # session + user, quiz, embargo (2), recent/own questions, 2 candidate scans, delete + insert, savepoints
+        self.assertLessEqual(len(ctx), 14, "\n".join(q["sql"] for q in ctx.captured_queries))
+        self.assertFalse(any("RANDOM()" in q["sql"].upper() for q in ctx.captured_queries))
+
+        with CaptureQueriesContext(connection) as ctx:   # same quotas again: candidate ids come from the cache
+            self.generate(quotas=[{"count": 12, "level": "Easy"}, {"count": 12, "level": "Hard"}])
+        self.assertFalse(any('"contest_question"."subject"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.generate(quotas=[{"count": 1}], status=403)
+
+
+@override_settings(STANDINGS_LIVE_RERANK_SECONDS=60)
+class LiveRerankTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Live", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.users = get_user_model().objects.bulk_create(
+            [get_user_model()(username=name) for name in ("ann", "bob", "cat")])
+
+    def setUp(self):
+        cache.clear()
+        caches["quiz"].clear()
+        invalidate_leaderboard(self.quiz.id)
+
+    def submit(self, user, score):
+        UserQuizResult.objects.create(user=user, quiz=self.quiz, score=score)
+        return rerank_if_due(self.quiz.id)
+
+    def standings(self, path=""):
+        response = self.client.get(f"/contest/Quizzes/{self.quiz.id}/standings/{path}", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        rows = data["results"] if isinstance(data, dict) else data
+        return [(row["username"], row["rank"]) for row in rows]
+
+    def close_window(self):
+        cache.delete(f"standings:rerank:{self.quiz.id}")
+
+    def test_results_inside_the_window_are_listed_unranked(self):
+        ann, bob, cat = self.users
+        self.assertTrue(self.submit(ann, 10))
+        self.assertFalse(self.submit(bob, 30))
+        self.assertFalse(self.submit(cat, 20))
+        self.assertEqual(self.standings(), [("ann", 1), ("bob", None), ("cat", None)])
+        self.assertEqual(self.standings("top/?k=2"), [("ann", 1), ("bob", None)])
+
+    def test_trailing_edge_ranks_after_the_window(self):
+        ann, bob, cat = self.users
+        self.submit(ann, 10)
+        self.submit(bob, 30)
+        self.submit(cat, 20)
+        self.close_window()
+        self.assertEqual(self.standings(), [("bob", 1), ("cat", 2), ("ann", 3)])
+
+    def test_nothing_pending_means_no_rerank(self):
+        self.submit(self.users[0], 10)
+        self.close_window()
+        with CaptureQueriesContext(connection) as ctx:
+            self.standings()
+        self.assertFalse(any(q["sql"].startswith("UPDATE") for q in ctx.captured_queries))
+
+    def test_cursor_walks_from_ranked_into_unranked_rows(self):
+        ann, bob, cat = self.users
+        self.submit(ann, 10)
+        self.submit(bob, 30)
+        self.submit(cat, 20)
+        seen, url = [], f"/contest/Quizzes/{self.quiz.id}/standings/?page_size=1"
+        while url:
+            data = self.client.get(url, HTTP_ACCEPT="application/json").json()
+            seen += [row["username"] for row in data["results"]]
+            url = data["next"]
+        self.assertEqual(seen, ["ann", "bob", "cat"])
+
+    def test_around_uses_live_order(self):
+        ann, bob, cat = self.users
+        self.submit(ann, 10)
+        self.submit(bob, 30)
+        self.submit(cat, 20)
+        response = self.client.get(f"/contest/Quizzes/{self.quiz.id}/standings/around/?user={cat.id}&n=1",
+                                   HTTP_ACCEPT="application/json")
+        # bob and cat are not ranked in the database yet; the leaderboard ranks them live
+        self.assertEqual([(row["username"], row["rank"]) for row in response.json()["results"]],
+                         [("bob", 1), ("cat", 2), ("ann", 3)])
+
+
+class LeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Live", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.users = get_user_model().objects.bulk_create(
+            [get_user_model()(username=f"user{i}") for i in range(5)])
+        UserQuizResult.objects.bulk_create([
+            UserQuizResult(user=user, quiz=cls.quiz, score=score, penalties=penalties)
+            for user, (score, penalties) in zip(cls.users, [(30, 0), (20, 1), (20, 1), (20, 0), (5, 0)])
+        ])
+
+    def setUp(self):
+        invalidate_leaderboard(self.quiz.id)
+        self.board = get_leaderboard(self.quiz.id)
+
+    def test_ranks_and_window(self):
+        u = [user.id for user in self.users]
+        self.assertEqual(self.board.verify(), [])
+        self.assertEqual([self.board.rank_of(i) for i in u], [1, 3, 3, 2, 5])
+        self.assertEqual([self.board.rank_of(i, "dense") for i in u], [1, 3, 3, 2, 4])
+        self.assertEqual([self.board.rank_of(i, "ordinal") for i in u], [1, 3, 4, 2, 5])
+        self.assertEqual(self.board.users_between(2, 3), [u[3], u[1]])
+
+    def test_committed_delta_is_applied(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_result_delta(self.users[4].id, self.quiz.id, 100, 1, 0)
+        board = get_leaderboard(self.quiz.id)
+        self.assertIs(board, self.board)   # updated in place, not reloaded
+        self.assertEqual(board.rank_of(self.users[4].id), 1)
+        self.assertEqual(board.verify(), [])
+
+    def test_rolled_back_delta_is_not_applied(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    apply_result_delta(self.users[4].id, self.quiz.id, -110, 0, 1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_leaderboard(self.quiz.id).rank_of(self.users[4].id), 5)
+        self.assertEqual(self.board.verify(), [])
+
+    def test_verify_compares_scores_not_just_order(self):
+        UserQuizResult.objects.filter(user=self.users[0]).update(score=29)   # still first, behind the board's back
+        self.assertEqual(self.board.verify(), [1])
+
+    def test_change_by_another_process_is_caught_up(self):
+        UserQuizResult.objects.filter(user=self.users[4]).update(score=50)
+        # the other process's log entry after its commit
+        LeaderboardChange.objects.create(quiz=self.quiz, version=self.board.version + 1, user=self.users[4])
+        with self.assertNumQueries(2):   # the new log entries, the changed row
+            board = get_leaderboard(self.quiz.id)
+        self.assertIs(board, self.board)
+        self.assertEqual(board.rank_of(self.users[4].id), 1)
+        self.assertEqual(board.verify(), [])
+
+        with self.assertNumQueries(1):   # nothing new
+            self.assertIs(get_leaderboard(self.quiz.id), board)
+
+    def test_wholesale_change_or_pruned_log_reloads(self):
+        UserQuizResult.objects.filter(user=self.users[4]).update(score=50)
+        LeaderboardChange.objects.create(quiz=self.quiz, version=self.board.version + 1, user=None)
+        board = get_leaderboard(self.quiz.id)
+        self.assertIsNot(board, self.board)
+        self.assertEqual(board.rank_of(self.users[4].id), 1)
+
+        LeaderboardChange.objects.create(quiz=self.quiz, version=board.version + 2, user=self.users[0])
+        self.assertIsNot(get_leaderboard(self.quiz.id), board)   # board.version + 1 is gone
+
+    def test_racing_writers_take_distinct_versions(self):
+        version = results_version(self.quiz.id)
+        # both writers read the same max; the second one's insert collides and retries
+        with mock.patch("contest.leaderboard.results_version", side_effect=[version, version, version + 1]):
+            self.assertEqual(_log_change(self.quiz.id, self.users[0].id), version + 1)
+            self.assertEqual(_log_change(self.quiz.id, self.users[1].id), version + 2)
+        self.assertEqual(list(LeaderboardChange.objects.filter(quiz=self.quiz, version__gt=version)
+                              .order_by("version").values_list("user_id", flat=True)),
+                         [self.users[0].id, self.users[1].id])
+
+
+class GradingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.scq, cls.mcq = Question.objects.bulk_create([
+            Question(title=q_type, level="Easy", subject="MATH", statement="...", type=q_type, is_visible=True)
+            for q_type in (Question.TYPE_SINGLE, Question.TYPE_MULTI)
+        ])
+        # SCQ: option 0 correct; MCQ: options 0 and 1 correct
+        cls.options = {
+            question.id: QuestionOption.objects.bulk_create([
+                QuestionOption(question=question, text=str(j), is_correct=j < correct)
+                for j in range(4)
+            ])
+            for question, correct in ((cls.scq, 1), (cls.mcq, 2))
+        }
+        QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=cls.quiz, question=question, order=i, base_points=10)
+            for i, question in enumerate((cls.scq, cls.mcq), start=1)
+        ])
+
+    def setUp(self):
+        self.key = AnswerKey.load(self.quiz.id)
+
+    def grade(self, question, *picks):
+        options = self.options[question.id]
+        return self.key.grade(self.key.quiz_questions[question.id], [options[j].id for j in picks])
+
+    def test_any_correct_pick_counts_by_default(self):
+        self.assertEqual(self.grade(self.scq, 0, 1), 10)
+        self.assertEqual(self.grade(self.scq, 1, 2), 0)
+        self.assertEqual(self.grade(self.mcq, 0, 2), 5)
+        self.assertEqual(self.grade(self.mcq, 0, 1, 2, 3), 10)
+
+    @override_settings(STRICT_GRADING=True)
+    def test_strict_scq_takes_exactly_the_correct_option(self):
+        self.assertEqual(self.grade(self.scq, 0), 10)
+        self.assertEqual(self.grade(self.scq, 1), 0)
+        self.assertEqual(self.grade(self.scq, 0, 1), 0)
+        self.assertEqual(self.grade(self.scq, 0, 1, 2, 3), 0)
+
+    @override_settings(STRICT_GRADING=True)
+    def test_strict_mcq_wrong_pick_scores_zero(self):
+        self.assertEqual(self.grade(self.mcq, 0, 1), 10)
+        self.assertEqual(self.grade(self.mcq, 1), 5)
+        self.assertEqual(self.grade(self.mcq, 0, 2), 0)
+        self.assertEqual(self.grade(self.mcq, 0, 1, 2, 3), 0)
+
+    def test_serializer_rejects_several_options_for_scq(self):
+        options = self.options[self.scq.id]
+        item = SubmissionItemSerializer(data={"question": self.scq.id, "selected_options": [options[0].id, options[1].id]},
+                                        context={"answer_key": self.key})
+        self.assertFalse(item.is_valid())
+        self.assertIn("selected_options", item.errors)
+
+        item = SubmissionItemSerializer(data={"question": self.mcq.id, "selected_options": [o.id for o in self.options[self.mcq.id][:2]]},
+                                        context={"answer_key": self.key})
+        self.assertTrue(item.is_valid(), item.errors)
+
+
+class IngestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="user")
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.question = Question.objects.create(title="Q", level="Easy", subject="MATH", statement="...",
+                                               type=Question.TYPE_INTEGER, correct_answer="7", is_visible=True)
+        QuizQuestion.objects.create(quiz=cls.quiz, question=cls.question, order=1, base_points=10)
+
+    def ingest(self, value):
+        return ingest_answers(self.user.id, self.quiz.id, [{"question": self.question.id, "submitted_value": value}],
+                              AnswerKey.load(self.quiz.id))
+
+    def test_concurrent_insert_is_retried_as_an_update(self):
+        self.ingest("7")
+        # another request committed the row just after this one looked for it
+        real = Submission.objects.select_for_update
+        misses = [Submission.objects.none()]
+        with mock.patch.object(Submission.objects, "select_for_update",
+                               side_effect=lambda: misses.pop() if misses else real()):
+            self.assertEqual(self.ingest("8"), (0, 1))
+
+        submission = Submission.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((submission.submitted_value, submission.points_rewarded), ("8", 0))
+        result = UserQuizResult.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual((result.correct_answers, result.penalties), (0, 1))
+        self.assertEqual(reconcile_results(self.quiz.id), [])
+
+    def submit(self):
+        caches["quiz"].clear()
+        self.client.force_login(self.user)
+        return self.client.post(f"/contest/Quizzes/{self.quiz.id}/submit/",
+                                {"question": self.question.id, "submitted_value": "7"}, content_type="application/json")
+
+    def test_hidden_quiz_takes_no_answers(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_visible=False)
+        self.assertEqual(self.submit().status_code, 403)
+        self.assertFalse(Submission.objects.filter(quiz=self.quiz).exists())
+
+    def test_finalized_result_takes_no_answers(self):
+        self.assertEqual(self.submit().status_code, 201)
+        UserQuizResult.objects.filter(user=self.user, quiz=self.quiz).update(status=UserQuizResult.Status.FINALIZED)
+        self.assertEqual(self.submit().status_code, 409)
+        self.assertEqual(Submission.objects.get(user=self.user, quiz=self.quiz).submitted_value, "7")
+
+
+class SubmissionQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = get_user_model().objects.bulk_create([get_user_model()(username=f"user{i}") for i in range(2)])
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.question = Question.objects.create(title="Q", level="Easy", subject="MATH", statement="...",
+                                               type=Question.TYPE_INTEGER, correct_answer="7", is_visible=True)
+        QuizQuestion.objects.create(quiz=cls.quiz, question=cls.question, order=1, base_points=10)
+
+    def setUp(self):
+        caches["quiz"].clear()
+
+    def test_failing_group_is_parked_without_blocking_the_queue(self):
+        good, bad = self.users
+        enqueue_answers(good.id, self.quiz.id, [{"question": self.question.id, "submitted_value": "7"}])
+        broken = enqueue_answers(bad.id, self.quiz.id, [{"submitted_value": "7"}])   # no question
+
+        with self.assertLogs("contest.submission_queue", "ERROR"):
+            self.assertEqual(drain_batch(), 2)
+        self.assertTrue(Submission.objects.filter(user=good, quiz=self.quiz).exists())
+        broken.refresh_from_db()
+        self.assertEqual((broken.attempts, broken.failed_at), (1, None))
+        self.assertIn("KeyError", broken.last_error)
+
+        with self.assertLogs("contest.submission_queue", "ERROR"):
+            for _ in range(MAX_ATTEMPTS - 1):
+                drain_batch()
+        broken.refresh_from_db()
+        self.assertIsNotNone(broken.failed_at)
+        self.assertEqual(drain_batch(), 0)
+        self.assertEqual((queue_stats()["depth"], queue_stats()["failed"]), (0, 1))
+
+        self.assertEqual(requeue_failed(), 1)
+        self.assertEqual(queue_stats()["depth"], 1)
+
+    def test_group_with_an_older_row_claimed_elsewhere_waits(self):
+        first, second, other = [
+            enqueue_answers(user.id, self.quiz.id, [{"question": self.question.id, "submitted_value": "7"}])
+            for user in (self.users[0], self.users[0], self.users[1])
+        ]
+        # another worker holds `first`; this one claimed the rest
+        self.assertEqual(_claimed_elsewhere([second, other]), {(self.users[0].id, self.quiz.id)})
+
+
+class AnswerKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.scq, cls.mcq = Question.objects.bulk_create([
+            Question(title=q_type, level="Easy", subject="MATH", statement="...", type=q_type, is_visible=True)
+            for q_type in (Question.TYPE_SINGLE, Question.TYPE_MULTI)
+        ])
+        cls.integer = Question.objects.create(title="INT", level="Easy", subject="MATH", statement="...",
+                                              type=Question.TYPE_INTEGER, correct_answer=" 42 ", is_visible=True)
+        # SCQ: option 0 correct; MCQ: options 0 and 1 correct
+        cls.options = {
+            question.id: QuestionOption.objects.bulk_create([
+                QuestionOption(question=question, text=str(j), is_correct=j < correct)
+                for j in range(4)
+            ])
+            for question, correct in ((cls.scq, 1), (cls.mcq, 2))
+        }
+        cls.quiz_questions = {
+            qq.question_id: qq for qq in QuizQuestion.objects.bulk_create([
+                QuizQuestion(quiz=cls.quiz, question=question, order=i, base_points=10)
+                for i, question in enumerate((cls.scq, cls.mcq, cls.integer), start=1)
+            ])
+        }
+
+    def setUp(self):
+        self.key = AnswerKey.load(self.quiz.id)
+
+    def grade(self, question, *picks, value=None):
+        options = self.options.get(question.id, [])
+        return self.key.grade(self.quiz_questions[question.id].id, [options[j].id for j in picks], value)
+
+    def test_scq(self):
+        self.assertEqual(self.grade(self.scq, 0), 10)
+        self.assertEqual(self.grade(self.scq, 1), 0)
+        self.assertEqual(self.grade(self.scq), 0)
+
+    def test_mcq_partial_credit(self):
+        self.assertEqual(self.grade(self.mcq, 0, 1), 10)
+        self.assertEqual(self.grade(self.mcq, 1), 5)
+        self.assertEqual(self.grade(self.mcq), 0)
+
+    def test_mcq_partial_credit_is_rounded_to_cents(self):
+        key = AnswerKey(0, {1: Question.TYPE_MULTI}, {1: Decimal(10)}, {1: frozenset({1, 2, 3})}, {1: None})
+        self.assertEqual(key.grade(1, {1}), Decimal("3.33"))
+        self.assertEqual(key.grade(1, {1, 2}), Decimal("6.67"))
+
+    def test_integer_answer_must_match_exactly(self):
+        self.assertEqual(self.grade(self.integer, value="42"), 10)
+        self.assertEqual(self.grade(self.integer, value=" 42\n"), 10)
+        self.assertEqual(self.grade(self.integer, value="41"), 0)
+        self.assertEqual(self.grade(self.integer, value="42.0"), 0)
+        self.assertEqual(self.grade(self.integer, value=None), 0)
+
+    def test_unknown_question_scores_zero(self):
+        self.assertEqual(self.key.grade(-1, [self.options[self.scq.id][0].id]), 0)
+
+    def test_rescore_quiz_fixes_stored_points(self):
+        user = get_user_model().objects.create(username="user")
+        submission = Submission.objects.create(user=user, quiz=self.quiz, question=self.quiz_questions[self.integer.id],
+                                               submitted_value="42", time_taken=1)
+        Submission.objects.filter(pk=submission.pk).update(points_rewarded=0)
+
+        self.assertEqual(rescore_quiz(self.quiz.id), 1)
+        submission.refresh_from_db()
+        self.assertEqual(submission.points_rewarded, 10)
+        self.assertEqual(rescore_quiz(self.quiz.id), 0)
+
+
+@override_settings(PENALTY_MULTIPLIER=2)
+class AggregationTests(TestCase):
+
+    def test_contribution(self):
+        self.assertEqual(contribution(Decimal("7.5")), (7.5, 1, 0))
+        self.assertEqual(contribution(0), (-2, 0, 1))
+
+    def test_submission_delta(self):
+        self.assertEqual(submission_delta(10), (10, 1, 0))
+        self.assertEqual(submission_delta(0), (-2, 0, 1))
+        self.assertEqual(submission_delta(0, old_points=10), (-12, -1, 1))   # right -> wrong
+        self.assertEqual(submission_delta(10, old_points=0), (12, 1, -1))    # wrong -> right
+        self.assertEqual(submission_delta(4, old_points=10), (-6, 0, 0))     # partial regrade
+        self.assertEqual(submission_delta(10, old_points=10), (0, 0, 0))
+
+    def test_reconcile_fixes_a_drifted_result(self):
+        user = get_user_model().objects.create(username="user")
+        quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        questions = Question.objects.bulk_create([
+            Question(title=f"Q{i}", level="Easy", subject="MATH", statement="...",
+                     type=Question.TYPE_INTEGER, correct_answer="1", is_visible=True)
+            for i in range(3)
+        ])
+        quiz_questions = QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=quiz, question=question, order=i, base_points=10)
+            for i, question in enumerate(questions, start=1)
+        ])
+        for qq, value in zip(quiz_questions, ("1", "1", "2")):
+            Submission.objects.create(user=user, quiz=quiz, question=qq, submitted_value=value, time_taken=1)
+        self.assertEqual(reconcile_results(quiz.id), [])
+
+        live = UserQuizResult.objects.filter(user=user, quiz=quiz)
+        live.update(score=999, correct_answers=0)
+        self.assertEqual(reconcile_results(quiz.id), [(user.id, quiz.id, (999, 0, 1), (18.0, 2, 1))])
+
+        reconcile_results(quiz.id, fix=True)
+        self.assertEqual(list(live.values_list("score", "correct_answers", "penalties")), [(18.0, 2, 1)])
+        self.assertEqual(reconcile_results(quiz.id), [])
+
+        live.delete()
+        self.assertEqual(reconcile_results(quiz.id), [(user.id, quiz.id, None, (18.0, 2, 1))])
+        reconcile_results(quiz.id, fix=True)
+        self.assertEqual(list(live.values_list("score", "correct_answers", "penalties")), [(18.0, 2, 1)])
+
+
+class StandingsReadTests(TestCase):
+    """Listing standings reads the stored results; it never regrades or writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="user")
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        question = Question.objects.create(title="Q", level="Easy", subject="MATH", statement="...",
+                                           type=Question.TYPE_INTEGER, correct_answer="1", is_visible=True)
+        quiz_question = QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=1, base_points=10)
+        cls.submission = Submission.objects.create(user=cls.user, quiz=cls.quiz, question=quiz_question,
+                                                   submitted_value="1", time_taken=1)
+        assign_ranks(cls.quiz.id)
+        # the key changes behind the results' back (no signal): only an explicit recompute may regrade
+        Question.objects.filter(pk=question.pk).update(correct_answer="2")
+
+    def test_get_does_not_regrade(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/contest/Quizzes/{self.quiz.id}/standings/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        rows = data["results"] if isinstance(data, dict) else data
+        self.assertEqual([(row["username"], row["score"], row["rank"]) for row in rows], [("user", 10.0, 1)])
+
+        writes = [q["sql"] for q in ctx.captured_queries if not q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(writes, [])
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.points_rewarded, 10)
+
+
+class RankTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.users = get_user_model().objects.bulk_create(
+            [get_user_model()(username=f"user{i}") for i in range(6)])
+        UserQuizResult.objects.bulk_create([
+            UserQuizResult(user=user, quiz=cls.quiz, score=score, penalties=penalties, status=status)
+            for user, (score, penalties, status) in zip(cls.users, [
+                (30, 0, "PENDING"), (20, 1, "PENDING"), (20, 1, "PENDING"),
+                (20, 0, "PENDING"), (5, 0, "PENDING"), (50, 0, "DQ"),
+            ])
+        ])
+
+    def ranks(self):
+        return list(UserQuizResult.objects.filter(quiz=self.quiz).order_by("user_id").values_list("rank", flat=True))
+
+    def check(self, assign):
+        expected = {
+            "competition": [1, 3, 3, 2, 5, None],
+            "dense": [1, 3, 3, 2, 4, None],
+            "ordinal": [1, 3, 4, 2, 5, None],   # the tie goes to the earlier result
+        }
+        for method, ranks in expected.items():
+            with self.subTest(method=method):
+                assign(self.quiz.id, method)
+                self.assertEqual(self.ranks(), ranks)
+
+    @unittest.skipUnless(_supports_update_from(), "needs UPDATE ... FROM")
+    def test_sql_ranks_with_ties(self):
+        self.check(_assign_ranks_sql)
+
+    def test_python_ranks_with_ties(self):
+        self.check(_assign_ranks_python)
+
+    def test_disqualified_result_loses_its_rank(self):
+        UserQuizResult.objects.filter(user=self.users[5]).update(rank=1)
+        assign_ranks(self.quiz.id)
+        self.assertEqual(self.ranks(), [1, 3, 3, 2, 5, None])
+        self.assertEqual(assign_ranks(self.quiz.id), 0)   # nothing left to change
+
+
+class RatingTests(TestCase):
+
+    def test_two_equal_players(self):
+        # Both rated 1500, so each one's seed (expected place) is 1 + 0.5 = 1.5.
+        # Winner: mid rank sqrt(1 * 1.5) = 1.2247; 1 + 2 * P(1500 beats R) >= 1.2247 holds up to
+        #   R = 1859, so the raw delta is trunc(359 / 2) = 179.
+        # Loser: mid rank sqrt(2 * 1.5) = 1.7321, up to R = 1595: trunc(95 / 2) = 47.
+        # Zero-sum: int(-(179 + 47) / 2) - 1 = -114 each; the top-4 cap leaves it there.
+        self.assertEqual(compute_rating_changes([1500, 1500], [1, 2]).tolist(), [65, -67])
+
+    def test_seed_table_matches_direct_sum(self):
+        ratings = np.array([1200, 1500, 1500, 1830, 2400])
+        table = seed_table(ratings, 1000, 2600)
+        for r in (1000, 1499, 1500, 2001, 2600):
+            self.assertAlmostEqual(table[r - 1000], 1 + win_probability(ratings, r).sum(), places=9)
+
+    def test_tied_participants_share_the_last_place(self):
+        self.assertEqual(tie_places(np.array([10, 10, 5, 5, 1]), np.array([0, 0, 1, 1, 0])).tolist(), [2, 2, 4, 4, 5])
+
+    def test_finalize_is_idempotent(self):
+        User = get_user_model()
+        users = [User.objects.create(username=f"user{i}", rating=1500) for i in range(2)]
+        quiz = Quiz.objects.create(title="Rated", subject="MATH", created_at=timezone.now(), is_visible=True, is_rated=True)
+        UserQuizResult.objects.bulk_create([
+            UserQuizResult(user=user, quiz=quiz, score=score) for user, score in zip(users, (20, 10))
+        ])
+
+        self.assertEqual(finalize_quiz(quiz.id), 2)
+        self.assertEqual(finalize_quiz(quiz.id), 0)
+
+        self.assertEqual([User.objects.get(pk=u.pk).rating for u in users], [1565, 1433])
+        self.assertEqual(list(UserQuizResult.objects.filter(quiz=quiz).order_by("rank")
+                              .values_list("rank", "status", "old_rating", "rating_change")),
+                         [(1, "FINALIZED", 1500, 65), (2, "FINALIZED", 1500, -67)])
+        self.assertEqual([u.profile.matches for u in User.objects.filter(pk__in=[u.pk for u in users])], [1, 1])
+
+
+class LiveStreamTests(TestCase):
+
+    def test_stream_needs_asgi(self):
+        quiz = Quiz.objects.create(title="Live", subject="MATH", created_at=timezone.now(), is_visible=True)
+        response = self.client.get(f"/contest/Quizzes/{quiz.id}/standings/stream/")
+        self.assertEqual(response.status_code, 501)
+        self.assertNotEqual(response["Content-Type"], "text/event-stream")
+
+    def test_diff_standings(self):
+        def row(user_id, rank, score):
+            return {"user_id": user_id, "rank": rank, "score": score}
+
+        previous = {1: row(1, 1, 30), 2: row(2, 2, 20), 3: row(3, 3, 10)}
+        current = {1: row(1, 1, 30), 3: row(3, 2, 25), 4: row(4, None, 0), 5: row(5, 3, 15)}
+        self.assertEqual(diff_standings(previous, current), {
+            "changed": [row(3, 2, 25), row(5, 3, 15), row(4, None, 0)],   # unranked last
+            "removed": [2],
+        })
+
+    @override_settings(LIVE_STANDINGS_TICK_SECONDS=0)
+    def test_publisher_survives_a_failed_tick(self):
+        row = {"user_id": 1, "username": "ann", "rank": 1, "score": 10, "penalties": 0, "correct_answers": 1}
+        reads = [{}, RuntimeError("database is locked")]
+
+        def fetch(quiz_id, limit):
+            if not reads:
+                return {1: row}
+            result = reads.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async def scenario():
+            publisher = StandingsPublisher()
+            queue = await publisher.subscribe(1)
+            self.assertTrue((await queue.get()).startswith("event: snapshot"))
+            delta = await asyncio.wait_for(queue.get(), timeout=5)
+            task = publisher._task
+            publisher.unsubscribe(1, queue)
+            await task
+            return delta
+
+        with mock.patch("contest.live.fetch_standings", fetch), self.assertLogs("contest.live", "ERROR"):
+            delta = asyncio.run(scenario())
+        self.assertEqual(delta, sse_event("delta", {"changed": [row], "removed": []}))
+
+
+class StandingWindowTests(TestCase):
+    """top and around at the edges of the standings."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", subject="MATH", created_at=timezone.now(), is_visible=True)
+        cls.users = get_user_model().objects.bulk_create(
+            [get_user_model()(username=f"user{i}") for i in range(7)])
+        # user0 first ... user4 last; user5 is disqualified, user6 never answered
+        UserQuizResult.objects.bulk_create([
+            UserQuizResult(user=user, quiz=cls.quiz, score=score, status=status)
+            for user, (score, status) in zip(cls.users, [
+                (50, "PENDING"), (40, "PENDING"), (30, "PENDING"), (20, "PENDING"), (10, "PENDING"), (90, "DQ"),
+            ])
+        ])
+        assign_ranks(cls.quiz.id)
+
+    def setUp(self):
+        cache.clear()
+        caches["quiz"].clear()
+        invalidate_leaderboard(self.quiz.id)
+
+    def get(self, path):
+        return self.client.get(f"/contest/Quizzes/{self.quiz.id}/standings/{path}", HTTP_ACCEPT="application/json")
+
+    def around(self, user, n=2):
+        response = self.get(f"around/?user={user.id}&n={n}")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data["user"]["rank"], [(row["username"], row["rank"]) for row in data["results"]]
+
+    def test_top(self):
+        self.assertEqual([row["username"] for row in self.get("top/?k=1").json()], ["user0"])
+        self.assertEqual([row["rank"] for row in self.get("top/?k=100").json()], [1, 2, 3, 4, 5])
+        self.assertEqual(self.get("top/?k=0").status_code, 400)
+
+    def test_around_the_leader(self):
+        self.assertEqual(self.around(self.users[0]), (1, [("user0", 1), ("user1", 2), ("user2", 3)]))
+
+    def test_around_the_last(self):
+        self.assertEqual(self.around(self.users[4]), (5, [("user2", 3), ("user3", 4), ("user4", 5)]))
+
+    def test_window_wider_than_the_standings(self):
+        rank, rows = self.around(self.users[2], n=100)
+        self.assertEqual((rank, len(rows)), (3, 5))
+
+    def test_around_unranked_users(self):
+        self.assertEqual(self.get(f"around/?user={self.users[5].id}").status_code, 404)   # disqualified
+        self.assertEqual(self.get(f"around/?user={self.users[6].id}").status_code, 404)   # no result
+        self.assertEqual(self.get("around/").status_code, 400)                            # anonymous, no ?user=
@@ -1,6 +1,6 @@
 from rest_framework_nested import routers
 from django.urls import path, include
-from.views import ChapterViewSet, QuizViewSet, QuestionViewSet,QuizQuestionViewSet, QuizStandingViewSet
+from.views import ChapterViewSet, QuizViewSet, QuestionViewSet,QuizQuestionViewSet, QuizStandingViewSet, SubmissionQueueView, standings_stream
 
 
 router = routers.DefaultRouter()
@@ -11,14 +11,13 @@ router.register('Quizzes', QuizViewSet)
 
 router.register('Questions', QuestionViewSet)
 
-router.register('submit', QuizStandingViewSet,  basename='quizstanding' )
-
 #router.register('QuizQuestion',QuizQuestionViewSet)
 
 
 # urls.py
 quiz_router = routers.NestedDefaultRouter(router, r'Quizzes', lookup='quiz')
 quiz_router.register(r'questions', QuizQuestionViewSet, basename='quiz-questions')
+quiz_router.register(r'standings', QuizStandingViewSet, basename='quiz-standings')
 
 
 
@@ -32,4 +31,8 @@ quiz_router.register(r'questions', QuizQuestionViewSet, basename='quiz-questions
 
 
 
-urlpatterns = router.urls + quiz_router.urls
+urlpatterns = [
+    path('submit-queue/', SubmissionQueueView.as_view(), name='submission-queue'),
+    # before the router so "stream" isn't taken for a standings pk
+    path('Quizzes/<int:quiz_pk>/standings/stream/', standings_stream, name='quiz-standings-stream'),
+] + router.urls + quiz_router.urls
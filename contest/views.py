@@ -1,19 +1,35 @@
 from django.shortcuts import render
-from django.db.models import Prefetch
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.db.models import Prefetch, Q
 from rest_framework.decorators import action
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import AllowAny, IsAdminUser,IsAuthenticatedOrReadOnly
-from.models import Chapter,Quiz, Question, QuizQuestion, UserQuizResult,Submission
-from.filters import ChapterFilter, QuizFilter
-from.serializers import (ChapterSerializer, QuizListSerializer,
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from.models import Chapter,Quiz, Question, QuizQuestion, UserQuizResult
+from.filters import ChapterFilter, QuestionFilter, QuizFilter
+from.embargo import exclude_embargoed
+from.facets import question_facets
+from.ingest import ingest_answers
+from.papers import generate_paper
+from.pagination import KeysetPagination, SearchResultsPagination, StandingCursorPagination
+from.live import stream_standings
+from.submission_queue import enqueue_answers, queue_stats
+from.question_cache import get_answer_key, get_quiz_payload, question_response
+from.leaderboard import get_leaderboard
+from.standings import rank_method, rerank_pending, standing_results, standings_after
+from.serializers import (ChapterSerializer, PaperSpecSerializer, QuizListSerializer,
                         QuizDetailSerializer, QuizUpdateSerializer,
-                        QuestionSerializer,QuizQuestionSerializer,StandingSerializer)
-from django.conf import settings
+                        QuestionSerializer,QuestionListSerializer,QuizQuestionSerializer,StandingSerializer,
+                        SubmissionBatchSerializer)
 
 from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 
 
 class ChapterViewSet(ModelViewSet):
@@ -33,10 +49,13 @@ class QuizViewSet(ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     renderer_classes = [JSONRenderer, TemplateHTMLRenderer]
     filterset_class = QuizFilter
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in ["create", "update", "partial_update", "destroy", "generate"]:
             return [IsAdminUser()]     # admin-only writes
+        if self.action == "submit":
+            return [IsAuthenticated()]
         return [AllowAny()]
     
     def get_serializer_class(self):
@@ -66,7 +85,8 @@ class QuizViewSet(ModelViewSet):
         return qs
     
     def list(self, request, *args, **kwargs):
-        qs = self.filter_queryset(self.get_queryset())
+        # flat rows straight from .values(); QuizListSerializer reads dicts as well as models
+        qs = self.filter_queryset(self.get_queryset()).values(*QuizListSerializer.Meta.fields)
         page = self.paginate_queryset(qs)
 
         # HTML branch
@@ -74,7 +94,8 @@ class QuizViewSet(ModelViewSet):
             items = page if page is not None else qs
             s = self.get_serializer(items, many=True, context={"request": request})
             return Response(
-                {"quizzes": s.data, "is_paginated": page is not None},
+                {"quizzes": s.data, "is_paginated": page is not None,
+                 "next": self.paginator.get_next_link() if page is not None else None},
                 template_name="quizzes/list.html",
             )
 
@@ -117,68 +138,93 @@ class QuizViewSet(ModelViewSet):
         Get a specific question by its order number (1-indexed).
         URL: /api/quizzes/{quiz_id}/question/{question_number}/
         """
-        quiz = self.get_object()
+        payload = get_quiz_payload(pk) if pk.isdigit() else None
+        if payload is None:
+            return Response({"error": "Quiz not found"}, status=404)
+
         question_number = int(question_number)
-        
+        questions = payload["questions"]
+        total_questions = len(questions)
+
         # Get the specific question by order
-        try:
-            quiz_question = quiz.quiz_question.select_related(
-                "question__chapter"
-            ).prefetch_related(
-                "question__options"
-            ).order_by("order")[question_number - 1]
-        except IndexError:
+        if not 1 <= question_number <= total_questions:
             return Response(
                 {"error": "Question not found"},
                 status=404
             )
-        
-        # Get total questions count
-        total_questions = quiz.quiz_question.count()
-        
-        # Prepare response data
-        question_data = {
-            "id": quiz_question.question.id,
-            "text": quiz_question.question.statement,
-            "chapter": {
-                "id": quiz_question.question.chapter.id,
-                "name": quiz_question.question.chapter.title,
-            } if quiz_question.question.chapter else None,
-            "options": [
-                {
-                    "id": opt.id,
-                    "text": opt.text,
-                    "is_correct": opt.is_correct
-                }
-                for opt in quiz_question.question.options.all()
-            ],
-            "order": quiz_question.order,
-        }
-
-        total_questions = quiz.quiz_question.count()
-
-        progress_percentage = round((question_number / total_questions) * 100, 1)
-        
-        response_data = {
-            "quiz_id": quiz.id,
-            "quiz_title": quiz.title,
-            "current_question": question_number,
-            "total_questions": total_questions,
-            "progress_percentage": progress_percentage,
-            "has_next": question_number < total_questions,
-            "has_previous": question_number > 1,
-            "question": question_data
-        }
-        
+
         # HTML response
         if request.accepted_renderer.format == "html":
             return Response(
-                response_data,
+                question_response(payload, question_number),
                 template_name="quizzes/question.html"
             )
-        
-        # JSON response
-        return Response(response_data)
+
+        # JSON response: pre-encoded bytes, 304 when the client already has them
+        etag = payload["etags"][question_number - 1]
+        if_none_match = {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload["bodies"][question_number - 1], content_type="application/json")
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    @action(detail=True, methods=['post'], url_path='submit')
+    def submit(self, request, pk=None):
+        """
+        Submit one or many answers of the current user in one request.
+        URL: /contest/Quizzes/{quiz_id}/submit/
+        Body: {"answers": [{"question": <question id>, "selected_options": [<option id>, ...],
+                            "submitted_value": "42", "time_taken": 12.5}, ...]}
+        A bare list of answers or a single answer object is accepted too.
+        Re-submitting a question replaces the earlier answer.
+        In write-behind mode the batch is queued and the response is 202.
+        Hidden quizzes take no answers (403), nor does a finalized result (409).
+        """
+        key = get_answer_key(int(pk)) if pk.isdigit() else None
+        if not key or not key.types:
+            return Response({"error": "Quiz not found or has no questions"}, status=404)
+        if not key.is_visible and not request.user.is_staff:
+            return Response({"error": "Quiz is not open for submissions"}, status=403)
+        if UserQuizResult.objects.filter(user_id=request.user.id, quiz_id=key.quiz_id, is_virtual=False,
+                                         status=UserQuizResult.Status.FINALIZED).exists():
+            return Response({"error": "Result already finalized"}, status=409)
+
+        data = request.data
+        if isinstance(data, list):
+            data = {"answers": data}
+        elif "answers" not in data:
+            data = {"answers": [data]}
+
+        s = SubmissionBatchSerializer(data=data, context={"request": request, "answer_key": key})
+        s.is_valid(raise_exception=True)
+
+        answers = s.validated_data["answers"]
+        if settings.SUBMISSION_WRITE_BEHIND:
+            enqueue_answers(request.user.id, key.quiz_id, answers)
+            return Response({"queued": len(answers)}, status=202)
+
+        created, updated = ingest_answers(request.user.id, key.quiz_id, answers, key)
+        return Response({"created": created, "updated": updated}, status=201)
+
+    @action(detail=True, methods=['post'], url_path='generate')
+    def generate(self, request, pk=None):
+        """
+        Replace the quiz's questions with a random paper drawn to quotas.
+        URL: /contest/Quizzes/{quiz_id}/generate/
+        Body: {"subject": "MATH", "quotas": [{"count": 5, "level": "Easy", "type": "SCQ", "chapter": 3}, ...],
+               "exclude_recent": 10, "base_points": 10, "seed": 42}
+        """
+        quiz = self.get_object()
+        spec = PaperSpecSerializer(data=request.data)
+        spec.is_valid(raise_exception=True)
+        try:
+            items = generate_paper(quiz, **spec.validated_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({"quiz_id": quiz.id, "questions": items}, status=201)
 
     @action(detail=True, methods=['get'], url_path='start')
     def start(self, request, pk=None):
@@ -214,14 +260,30 @@ class QuestionViewSet(ModelViewSet): #Displays questions on all question pages (
 
     renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
 
-    queryset = Question.objects.all()
+    # chapter and options are nested in QuestionSerializer; fetch them up front
+    queryset = Question.objects.select_related('chapter').prefetch_related('options')
     
     
     serializer_class = QuestionSerializer
+    filterset_class = QuestionFilter      # ?q= full-text search, subject / level / type / chapter
+    pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        # ?q= results come ranked; a created_at keyset would undo that order
+        if not hasattr(self, '_paginator'):
+            searching = self.request is not None and self.request.query_params.get('q')
+            self._paginator = SearchResultsPagination() if searching else self.pagination_class()
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return QuestionListSerializer
+        return QuestionSerializer
 
 
     def get_permissions(self):
-        if self.action in ['list','retrieve']:
+        if self.action in ['list','retrieve','facets']:
             return [AllowAny()]
         
         return [IsAdminUser()]
@@ -233,35 +295,41 @@ class QuestionViewSet(ModelViewSet): #Displays questions on all question pages (
         if user and user.is_staff:
             return qs
 
-        next_quiz = (Quiz.objects.filter(is_visible = False, quiz_question__isnull = False).order_by('-id').first())
-        print(next_quiz.id)
-
-        if not next_quiz:
-            print('test1')
-            return qs
+        # questions of the next hidden quiz stay out of the public bank (cached id set, no extra query)
+        return exclude_embargoed(qs)
 
-
-        next_q_ids = list(QuizQuestion.objects.filter(quiz_id = next_quiz.id).values_list('question_id',flat= True))
-        print(next_q_ids)
-
-        if not next_q_ids:
-            print('test2')
-            return qs
-        return qs.exclude(id__in = next_q_ids)
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer])
+    def facets(self, request):
+        """
+        Question counts by subject, chapter, level and type under the list's filters (embargo included).
+        URL: /contest/Questions/facets/?subject=MATH&q=integral
+        """
+        filters = {name: request.query_params.get(name, '') for name in self.filterset_class.base_filters}
+        facets = question_facets(filters, embargoed=not request.user.is_staff,
+                                 queryset=lambda: self.filter_queryset(self.get_queryset()))
+        return Response(facets)
     
     
 #---------------------------CPT CODE BLOCK STARTS HERE--------------------------------------#
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        # one page of .values() rows plus one query for their options, however many questions there are
+        queryset = (self.filter_queryset(self.get_queryset())
+                    .prefetch_related(None)
+                    .values(*QuestionListSerializer.PROJECTION))
 
         # DRF pagination still works for JSON; for HTML we’ll manually pass items
         page = self.paginate_queryset(queryset)
+        if page is not None:
+            page = QuestionListSerializer.with_options(page)
+        else:
+            queryset = QuestionListSerializer.with_options(queryset)
         if request.accepted_renderer.format == 'html':
             items = page if page is not None else queryset
             serializer = self.get_serializer(items, many=True, context={'request': request})
             return Response(
-                {'questions': serializer.data, 'is_paginated': page is not None},
+                {'questions': serializer.data, 'is_paginated': page is not None,
+                 'next': self.paginator.get_next_link() if page is not None else None},
                 template_name='questions/list.html'
             )
 
@@ -286,7 +354,7 @@ class QuestionViewSet(ModelViewSet): #Displays questions on all question pages (
 
 class QuizQuestionViewSet(ModelViewSet):
 
-    
+    queryset = QuizQuestion.objects.order_by('order', 'id')
 
     def get_queryset(self):
         qs = super().get_queryset().select_related(
@@ -306,99 +374,107 @@ class QuizStandingViewSet(ModelViewSet):
     serializer_class = StandingSerializer
     permission_classes = [AllowAny]
     http_method_names = ['get']
+    pagination_class = StandingCursorPagination
 
     def get_queryset(self):
-
+        """
+        Read-only: standings come straight from the stored results and their
+        materialized rank. Regrading is an explicit admin operation
+        (see standings.recompute_standings), never a side effect of a GET;
+        the most a read does is the throttled re-rank of submits that landed
+        inside the last live re-rank window. Rows not ranked yet come last.
+        """
         quiz_id = self.kwargs.get('quiz_pk')
+        rerank_pending(quiz_id)
 
-        return (UserQuizResult.objects
+        return (standing_results(quiz_id)
             .select_related("user")
-            .filter(quiz_id=quiz_id, is_virtual=False)
-            .exclude(status=UserQuizResult.Status.DISQUALIFIED)
-            .order_by("-score", "penalties", "created_at", "id")
-
-
+            .order_by("rank", "id")   # the paginator / standings_after split ranked and unranked rows
             )
-    
-    
-    def submission_check(self,submission):
-
-            question = submission.question.question
-            
-            if question.type == 'SCQ':
-                correct_option = question.options.filter(is_correct = True).first()
-
-                if correct_option and submission.selected_options.filter(id= correct_option.id).exists():
-                    submission.points_rewarded = question.base_points
-                else:
-                    submission.points_rewarded = 0
-
-            elif question.type == 'MCQ':
-                correct_options = set(question.options.filter(is_correct = True).values_list('id', flat=True))
-                selected_options = set(submission.selected_options.values_list('id', flat=True))
-
-                correct_count = len(correct_options & selected_options)
-                total_correct = len(correct_options) 
-
-                if total_correct > 0:
-                    submission.points_rewarded = (correct_count / total_correct) * question.base_points
-                else:
-                    submission.points_rewarded = 0  # Or handle this case differently if needed
-                
-            elif question.type == 'INT':
-
-                correct_answer = question.correct_answer
-                if int(correct_answer) == int(submission.submitted_value):
-                    submission.points_rewarded = question.base_points
-                else:
-                    submission.points_rewarded = 0 
-
-            submission.save()
-
-
-
-
 
-    def list(self, request, **kwargs):
-
-        query_set = self.get_queryset()
-
-
-
-        quiz_id = self.kwargs.get('quiz_pk')
+    @action(detail=False, methods=['get'])
+    def top(self, request, quiz_pk=None):
+        """
+        The first k rows of the standings.
+        URL: /contest/Quizzes/{quiz_id}/standings/top/?k=50
+        """
+        k = _int_param(request, "k", default=50, maximum=StandingCursorPagination.max_page_size)
+        if k is None:
+            return Response({"error": "k must be a positive integer"}, status=400)
 
-    
+        serializer = self.get_serializer(standings_after(self.get_queryset(), k), many=True)
+        return Response(serializer.data)
 
-        for result in query_set:
+    @action(detail=False, methods=['get'])
+    def around(self, request, quiz_pk=None):
+        """
+        n rows on each side of one participant (the current user unless ?user= is given).
+        URL: /contest/Quizzes/{quiz_id}/standings/around/?n=5&user=<user id>
+        """
+        n = _int_param(request, "n", default=5, maximum=100)
+        if n is None:
+            return Response({"error": "n must be a positive integer"}, status=400)
+
+        user_id = _int_param(request, "user", default=request.user.id or 0, maximum=float("inf"))
+        if user_id is None:
+            return Response({"error": "Log in or pass ?user=<id>"}, status=400)
+
+        if not str(quiz_pk).isdigit():
+            return Response({"error": "Quiz not found"}, status=404)
+
+        # live order from the in-process leaderboard: a bisect for the user's
+        # position, a slice for the window, then one query for the rows
+        board = get_leaderboard(int(quiz_pk))
+        position = board.position_of(user_id)
+        if position is None:
+            return Response({"error": "User has no result in this quiz"}, status=404)
+        user_ids = board.users_between(position - n, position + n)
+
+        results = {r.user_id: r for r in self.get_queryset().filter(user_id__in=user_ids)}
+        rows = [results[uid] for uid in user_ids if uid in results]
+        method = rank_method()
+        for row in rows:
+            row.rank = board.rank_of(row.user_id, method)   # live rank, not the throttled stored one
+
+        me = results.get(user_id)
+        return Response({
+            "user": self.get_serializer(me).data if me else None,
+            "results": self.get_serializer(rows, many=True).data,
+        })
 
-            submissions = Submission.objects.filter(user_id = result.user_id, quiz_id = result.quiz_id)
-            result.correct_answers = 0
-            result.penalties = 0
-            total_points = 0
 
-            for submission in submissions:
-                self.submission_check(submission)
-                total_points = total_points + submission.points_rewarded
-                
+def _int_param(request, name, default, maximum):
+    """Positive integer query param, capped at maximum; None if invalid."""
+    try:
+        value = int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        return None
+    return min(value, maximum) if value > 0 else None
 
-                if submission.points_rewarded>0:
-                    result.correct_answers = result.correct_answers + 1
-                else:
-                    result.penalties = result.penalties + 1
-            
 
+class SubmissionQueueView(APIView):
+    """Write-behind queue depth and lag, for sizing drain_submissions workers."""
 
+    permission_classes = [IsAdminUser]
+    renderer_classes = [JSONRenderer]
 
-            result.score = total_points - result.penalties * settings.PENALTY_MULTIPLIER
-        
-            result.save()
+    def get(self, request):
+        return Response({"write_behind": settings.SUBMISSION_WRITE_BEHIND, **queue_stats()})
 
-        serializer = self.get_serializer(query_set, many=True)
-        return Response(serializer.data)
 
-         
-        
-                           
+async def standings_stream(request, quiz_pk):
+    """
+    Live standings as Server-Sent Events: a "snapshot" event with the top rows,
+    then "delta" events ({"changed": [...], "removed": [user ids]}) at most once
+    per LIVE_STANDINGS_TICK_SECONDS. Needs the ASGI app (config.asgi); a WSGI
+    worker would hold a thread per client forever.
+    URL: /contest/Quizzes/{quiz_id}/standings/stream/
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Live standings are only served by the ASGI application"}, status=501)
 
-       # Still need to think about this
+    response = StreamingHttpResponse(stream_standings(quiz_pk), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"    # don't let nginx buffer the stream
+    return response
 